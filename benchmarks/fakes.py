@@ -0,0 +1,213 @@
+"""Local stand-ins for Alpaca, marketdata.app and Yahoo Finance with synthetic data
+
+Everything is deterministic per ticker so runs are comparable, with configurable
+latency and failure injection.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from datetime import datetime, timedelta
+import pandas as pd
+import numpy as np
+import threading
+import random
+import json
+import time
+import zlib
+
+class FakeUpstreamError(Exception):
+    pass
+
+class Faults:
+    """Latency and failure injection shared by all fakes"""
+
+    def __init__(self, latency_ms=0.0, failure_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def apply(self):
+        """Sleep for the injected latency, return True if this call should fail"""
+        with self._lock:
+            jitter = self._random.uniform(0.5, 1.5)
+            fail = self._random.random() < self.failure_rate
+        if self.latency_ms:
+            time.sleep(self.latency_ms * jitter / 1000)
+        return fail
+
+
+def base_price(ticker):
+    return 20.0 + zlib.crc32(ticker.encode()) % 500
+
+def underlying_price(ticker, timestamps):
+    """Smooth synthetic path around the ticker's base price"""
+    hours = timestamps.asi8 / 3.6e12
+    return base_price(ticker) * (1 + 0.03 * np.sin(hours / 40 + zlib.crc32(ticker.encode()) % 7))
+
+def strike_step(price):
+    return 1.0 if price < 50 else 2.5 if price < 200 else 5.0
+
+def session_timestamps(start, end, minutes):
+    """Regular-session bar timestamps (UTC) between start and end"""
+    # alpaca-py requests may carry naive datetimes, which the real API reads as UTC
+    start, end = (pd.Timestamp(t) for t in (start, end))
+    start = (start.tz_localize('UTC') if start.tzinfo is None else start).tz_convert('US/Eastern')
+    end = (end.tz_localize('UTC') if end.tzinfo is None else end).tz_convert('US/Eastern')
+    days = pd.bdate_range(start.normalize().tz_localize(None), end.normalize().tz_localize(None))
+    per_day = pd.timedelta_range(start='9h30min', end='15h59min', freq=f'{minutes}min')
+    stamps = pd.DatetimeIndex([d + offset for d in days for offset in per_day]).tz_localize('US/Eastern')
+    stamps = stamps[(stamps >= start) & (stamps <= end)]
+    return stamps.tz_convert('UTC')
+
+
+def synthetic_earnings_dates(ticker, count=20, upcoming=1):
+    """Quarterly report dates ending `upcoming` quarters after today"""
+    offset = zlib.crc32(ticker.encode()) % 60
+    last = datetime.now().date() + timedelta(days=offset - 30 + 91 * upcoming)
+    dates = [last - timedelta(days=91 * i) for i in range(count)]
+    # Keep them on weekdays
+    return [d - timedelta(days=max(0, d.weekday() - 4)) for d in dates]
+
+def earnings_table_html(ticker, count=20):
+    """Yahoo calendar page with the earnings table in the initial HTML"""
+    rows = []
+    for i, d in enumerate(synthetic_earnings_dates(ticker, count)):
+        when = '4 PM EDT' if (zlib.crc32(ticker.encode()) + i) % 3 else '8 AM EDT'
+        rows.append(f"<tr><td>{ticker}</td><td>{ticker} Corp</td><td>{d.strftime('%b %d, %Y')} at {when}</td>"
+                    f"<td>1.10</td><td>1.20</td><td>+9.09</td></tr>")
+    return ("<html><body><table class=\"bd\"><thead><tr><th>Symbol</th><th>Company</th><th>Earnings Date</th>"
+            "<th>EPS Estimate</th><th>Reported EPS</th><th>Surprise(%)</th></tr></thead><tbody>"
+            + ''.join(rows) + "</tbody></table></body></html>")
+
+def synthetic_chain(ticker, quote_date, from_date, to_date, strikes_per_side=40):
+    """OCC symbols for Friday expiries between from_date and to_date"""
+    price = underlying_price(ticker, pd.DatetimeIndex([pd.Timestamp(quote_date, tz='UTC')]))[0]
+    step = strike_step(price)
+    center = round(price / step) * step
+    strikes = center + step * np.arange(-strikes_per_side, strikes_per_side + 1)
+    strikes = strikes[strikes > 0]
+
+    expiries = [d for d in pd.date_range(from_date, to_date) if d.weekday() == 4]
+    return [f"{ticker}{e.strftime('%y%m%d')}{right}{int(round(k * 1000)):08d}"
+            for e in expiries for right in 'CP' for k in strikes]
+
+def synthetic_option_bars(symbol, start, end, minutes):
+    """Raw Alpaca-style bars ({'t', 'o', 'h', 'l', 'c', 'v', 'n', 'vw'}) for one contract"""
+    ticker = symbol[:-15]
+    expiry = pd.Timestamp(datetime.strptime(symbol[-15:-9], '%y%m%d')).tz_localize('US/Eastern') + pd.Timedelta(hours=16)
+    right = symbol[-9]
+    strike = int(symbol[-8:]) / 1000
+
+    stamps = session_timestamps(start, end, minutes)
+    spot = underlying_price(ticker, stamps)
+    years = np.maximum((expiry.tz_convert('UTC') - stamps).total_seconds() / (365 * 86400), 1e-4)
+    intrinsic = np.maximum(spot - strike, 0) if right == 'C' else np.maximum(strike - spot, 0)
+    close = np.round(intrinsic + 0.4 * 0.5 * spot * np.sqrt(years) * np.exp(-abs(spot - strike) / spot * 8), 2)
+
+    return [{'t': t.strftime('%Y-%m-%dT%H:%M:%SZ'), 'o': c, 'h': c, 'l': c, 'c': c, 'v': 10, 'n': 3, 'vw': c}
+            for t, c in zip(stamps, close)]
+
+
+def no_browser():
+    raise FakeUpstreamError("browser fallback is disabled in benchmarks")
+
+
+def _timeframe_minutes(timeframe):
+    unit = str(timeframe.unit_value).split('.')[-1].lower()
+    return timeframe.amount_value * (60 if unit.startswith('hour') else 1)
+
+class FakeOptionClient:
+    """Stand-in for OptionHistoricalDataClient(raw_data=True)"""
+
+    def __init__(self, faults):
+        self.faults = faults
+        self.calls = 0
+
+    def get_option_bars(self, req):
+        self.calls += 1
+        if self.faults.apply():
+            raise FakeUpstreamError("injected option bars failure")
+        symbols = req.symbol_or_symbols if isinstance(req.symbol_or_symbols, list) else [req.symbol_or_symbols]
+        minutes = _timeframe_minutes(req.timeframe)
+        return {s: synthetic_option_bars(s, req.start, req.end, minutes) for s in symbols}
+
+class FakeStockClient:
+    """Stand-in for StockHistoricalDataClient(raw_data=True)"""
+
+    def __init__(self, faults):
+        self.faults = faults
+        self.calls = 0
+
+    def get_stock_bars(self, req):
+        self.calls += 1
+        if self.faults.apply():
+            raise FakeUpstreamError("injected stock bars failure")
+        symbols = req.symbol_or_symbols if isinstance(req.symbol_or_symbols, list) else [req.symbol_or_symbols]
+        stamps = session_timestamps(req.start, req.end, _timeframe_minutes(req.timeframe))
+        data = {}
+        for s in symbols:
+            closes = np.round(underlying_price(s, stamps), 2)
+            data[s] = [{'t': t.strftime('%Y-%m-%dT%H:%M:%SZ'), 'o': c, 'h': c, 'l': c, 'c': c, 'v': 1000, 'n': 10, 'vw': c}
+                       for t, c in zip(stamps, closes)]
+        return data
+
+
+class FakeUpstreamServer:
+    """Local HTTP server answering marketdata.app chain and Yahoo earnings calendar requests"""
+
+    def __init__(self, faults):
+        self.faults = faults
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real upstreams
+
+            def do_GET(self):
+                server.requests += 1
+                fail = server.faults.apply()
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+                if url.path.startswith('/v1/options/chain/'):
+                    if fail:
+                        return self._send(500, {'s': 'error', 'errmsg': 'injected failure'})
+                    ticker = url.path.split('/')[4]
+                    symbols = synthetic_chain(ticker, query['date'], query['from'], query['to'])
+                    return self._send(200, {'s': 'ok', 'optionSymbol': symbols})
+                if url.path.startswith('/calendar/earnings'):
+                    if fail:
+                        return self._send(500, '<html>error</html>')
+                    return self._send(200, earnings_table_html(query['symbol'], int(query.get('size', 20))))
+                self._send(404, {'s': 'error', 'errmsg': 'not found'})
+
+            def _send(self, status, body):
+                if isinstance(body, str):
+                    payload, content_type = body.encode(), 'text/html'
+                else:
+                    payload, content_type = json.dumps(body).encode(), 'application/json'
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,68 @@
+"""Import-time budget check for the app's own modules
+
+Imports every module app.py needs (minus Streamlit itself) in a fresh interpreter with
+-X importtime, and fails when the total exceeds the budget or a heavy dependency that
+should load lazily gets pulled in at import.
+
+Usage:
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --budget-ms 800 --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['get_earnings_dates', 'get_options', 'performance', 'analytics', 'charts',
+           'result_cache', 'telemetry', 'gateway', 'providers', 'batch']
+
+# Only loaded on first use: API clients, the browser, the exchange calendar, chart and HTML libraries
+LAZY = ['alpaca', 'selenium', 'pandas_market_calendars', 'exchange_calendars', 'plotly', 'bs4', 'streamlit']
+
+def measure(modules):
+    """(self_us, cumulative_us, name) per imported module, plus the names of every module loaded"""
+    imports = f"import {', '.join(modules)}; " if modules else ''
+    code = (f"import sys; sys.path.insert(0, {os.path.join(ROOT_DIR, 'src')!r}); "
+            f"{imports}print('\\n'.join(sys.modules))")
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          capture_output=True, text=True, env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'})
+    if proc.returncode:
+        raise RuntimeError(proc.stderr[-2000:])
+
+    timings = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return timings, set(proc.stdout.split())
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when importing the app modules gets too slow")
+    parser.add_argument('--budget-ms', type=float, default=1000.0, help="Max total import time")
+    parser.add_argument('--top', type=int, default=10, help="Slowest top-level imports to list")
+    args = parser.parse_args()
+
+    # Modules every interpreter loads at startup don't count against the budget
+    startup = {name.strip() for _, _, name in measure([])[0]}
+    timings, loaded = measure(MODULES)
+    # Top-level entries (no indentation) add up to the whole import
+    top_level = [(cumulative, name.strip()) for _, cumulative, name in timings
+                 if not name.startswith('  ') and name.strip() not in startup]
+    total_ms = sum(cumulative for cumulative, _ in top_level) / 1000
+
+    print(f"Total import time: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    for cumulative, name in sorted(top_level, reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    eager = sorted(m for m in LAZY if m in loaded)
+    if eager:
+        print(f"Loaded at import but should be lazy: {', '.join(eager)}")
+    if eager or total_ms > args.budget_ms:
+        sys.exit(1)
+    print("OK")
+
+if __name__ == '__main__':
+    main()
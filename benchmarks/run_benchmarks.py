@@ -0,0 +1,300 @@
+"""Offline benchmark suite: latency and throughput of the data pipeline against local stand-ins
+
+Usage:
+    python benchmarks/run_benchmarks.py --scales 1 50 500 --latency-ms 20 --failure-rate 0.01
+    python benchmarks/run_benchmarks.py --scales 50 --baseline benchmarks/results/<previous>.json
+
+Results are written as JSON to benchmarks/results/ so runs can be compared across versions.
+"""
+import argparse
+import datetime as dt
+import http.client
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+import fakes
+
+
+def summarize(latencies, errors, wall_sec):
+    """Latency percentiles (ms) and throughput for one benchmark"""
+    ms = np.array(latencies) * 1000 if latencies else np.array([np.nan])
+    calls = len(latencies) + errors
+    return {
+        'calls': calls,
+        'errors': errors,
+        'mean_ms': round(float(np.nanmean(ms)), 3),
+        'p50_ms': round(float(np.nanpercentile(ms, 50)), 3),
+        'p95_ms': round(float(np.nanpercentile(ms, 95)), 3),
+        'max_ms': round(float(np.nanmax(ms)), 3),
+        'wall_sec': round(wall_sec, 3),
+        'ops_per_sec': round(calls / wall_sec, 2) if wall_sec else None,
+    }
+
+def timed(fn, items):
+    """Call fn on every item, timing each call; exceptions count as errors"""
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        try:
+            fn(*item)
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def timed_concurrent(fn, items, clients):
+    """Like timed, with `clients` threads each working through its share of the items"""
+    def worker(share):
+        latencies, errors = [], 0
+        for item in share:
+            t0 = time.perf_counter()
+            try:
+                fn(*item)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - t0)
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        outcomes = list(pool.map(worker, [items[i::clients] for i in range(clients)]))
+    return summarize([l for ls, _ in outcomes for l in ls], sum(e for _, e in outcomes), time.perf_counter() - start)
+
+
+def fresh_database(workdir, name):
+    import config
+    config.DB_PATH = os.path.join(workdir, f'{name}.db')
+
+def run_scale(workdir, tickers, lookback, lookahead, workers, api_clients):
+    import batch
+    import config
+    import get_earnings_dates
+    import get_options
+    import result_cache
+    import utils
+
+    results = {}
+
+    fresh_database(workdir, f'micro-{len(tickers)}')
+    for phase in ('cold', 'warm'):
+        results[f'get_past_earnings_dates/{phase}'] = timed(get_earnings_dates.get_past_earnings_dates,
+                                                            [(t,) for t in tickers])
+
+    # One event per ticker: the latest past report
+    events = []
+    for t in tickers:
+        try:
+            earnings_date, _ = get_earnings_dates.get_past_earnings_dates(t)[0]
+        except Exception:
+            continue
+        start_date, _ = get_options.get_trading_window(earnings_date, lookback, lookahead)
+        events.append((t, earnings_date, start_date))
+
+    for phase in ('cold', 'warm'):
+        results[f'find_symbol/{phase}'] = timed(get_options.find_symbol, events)
+    for phase in ('cold', 'warm'):
+        results[f'get_options_data/{phase}'] = timed(get_options.get_options_data,
+                                                     [(t, d, lookback, lookahead) for t, d, _ in events])
+
+    # Chain warm-up for every past-year event, serial versus concurrent, each on a cold cache
+    cutoff = dt.date.today() - dt.timedelta(days=366)
+    chain_requests = []
+    for t in tickers:
+        try:
+            dates = [d for d, _ in get_earnings_dates.get_past_earnings_dates(t) if d > cutoff]
+        except Exception:
+            continue
+        chain_requests += [get_options.chain_request(t, d, get_options.get_trading_window(d, lookback, lookahead)[0])
+                           for d in dates]
+    for concurrency in sorted({1, config.CHAIN_FETCH_CONCURRENCY}):
+        fresh_database(workdir, f'chains-{len(tickers)}-c{concurrency}')
+        start = time.perf_counter()
+        chains = utils.fetch_chains(chain_requests, concurrency)
+        wall = time.perf_counter() - start
+        results[f'chain_warmup/c{concurrency}'] = {
+            'calls': len(chain_requests),
+            'errors': sum(c is None or isinstance(c, Exception) for c in chains),
+            'wall_sec': round(wall, 3),
+            'ops_per_sec': round(len(chain_requests) / wall, 2) if wall else None,
+        }
+
+    # Full per-ticker pipeline through batch mode, cold database then warm
+    fresh_database(workdir, f'pipeline-{len(tickers)}')
+    for phase in ('cold', 'warm'):
+        result_cache.results.clear()
+        stats = batch.run_batch(tickers, lookback, lookahead, workers=workers, run_id=f'bench-{phase}')
+        results[f'pipeline/{phase}'] = {k: v for k, v in stats.items() if k != 'run_id'}
+    results.update(run_api(workdir, tickers, lookback, lookahead, api_clients))
+    return results
+
+def run_api(workdir, tickers, lookback, lookahead, clients):
+    """JSON service latency per ticker (concurrent keep-alive clients) and batch streaming throughput"""
+    import api_server
+    import result_cache
+
+    server = api_server.ApiServer(host='127.0.0.1', port=0)
+    address = urlsplit(server.start()).netloc
+    local = threading.local()
+
+    def get_events(ticker):
+        # One keep-alive connection per client thread
+        if getattr(local, 'conn', None) is None:
+            local.conn = http.client.HTTPConnection(address, timeout=120)
+        local.conn.request('GET', f'/v1/events?ticker={ticker}&lookback={lookback}&lookahead={lookahead}')
+        response = local.conn.getresponse()
+        body = json.loads(response.read())
+        if response.status != 200 or any(e['status'] == 'error' for e in body['events']):
+            raise RuntimeError(f"{ticker}: {response.status}")
+
+    results = {}
+    try:
+        fresh_database(workdir, f'api-{len(tickers)}')
+        result_cache.results.clear()
+        for phase in ('cold', 'warm'):
+            results[f'api_events/{phase}'] = timed_concurrent(get_events, [(t,) for t in tickers], clients)
+
+        # One streamed batch over every ticker: time to the first event and events/sec overall
+        for phase in ('cold', 'warm'):
+            if phase == 'cold':
+                fresh_database(workdir, f'api-batch-{len(tickers)}')
+                result_cache.results.clear()
+            conn = http.client.HTTPConnection(address, timeout=600)
+            body = json.dumps({'tickers': tickers, 'lookback': lookback, 'lookahead': lookahead})
+            start = time.perf_counter()
+            conn.request('POST', '/v1/batch', body=body, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            first_line, lines = None, []
+            while line := response.readline():
+                first_line = first_line or time.perf_counter() - start
+                lines.append(json.loads(line))
+            wall = time.perf_counter() - start
+            conn.close()
+            events = lines[-1]['events'] if lines and lines[-1].get('done') else {}
+            results[f'api_batch/{phase}'] = {
+                'tickers': len(tickers),
+                'events': events,
+                'first_event_ms': round(first_line * 1000, 3) if first_line else None,
+                'wall_sec': round(wall, 3),
+                'events_per_sec': round(sum(events.values()) / wall, 2) if wall else None,
+            }
+    finally:
+        server.stop()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, text=True).strip()
+    except Exception:
+        return 'unknown'
+
+def compare(current, baseline):
+    """Print p50 change per benchmark against a previous results file"""
+    print(f"\n{'benchmark':45} {'baseline p50':>14} {'current p50':>14} {'change':>9}")
+    for scale, benches in current['results'].items():
+        for name, stats in benches.items():
+            old = baseline.get('results', {}).get(scale, {}).get(name, {})
+            if 'p50_ms' not in stats or 'p50_ms' not in old or not old['p50_ms']:
+                continue
+            change = (stats['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+            print(f"{scale + ' ' + name:45} {old['p50_ms']:>14.2f} {stats['p50_ms']:>14.2f} {change:>8.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the earnings straddle pipeline offline")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 50, 500], help="Ticker counts to run")
+    parser.add_argument('--latency-ms', type=float, default=20.0, help="Injected latency per upstream call")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Probability an upstream call fails")
+    parser.add_argument('--lookback', type=int, default=5)
+    parser.add_argument('--lookahead', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=4, help="Batch-mode worker processes")
+    parser.add_argument('--api-clients', type=int, default=8, help="Concurrent clients against the JSON API")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rate-limits', action='store_true',
+                        help="Keep the configured per-provider rate limits (the fakes don't need them)")
+    parser.add_argument('--out', help="Output JSON path (default benchmarks/results/<timestamp>-<commit>.json)")
+    parser.add_argument('--baseline', help="Previous results JSON to compare against")
+    args = parser.parse_args()
+    out = os.path.abspath(args.out) if args.out else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    logging.basicConfig(level=logging.WARNING)
+    faults = fakes.Faults(args.latency_ms, args.failure_rate, args.seed)
+    server = fakes.FakeUpstreamServer(faults)
+    base_url = server.start()
+
+    workdir = tempfile.mkdtemp(prefix='earnings-bench-')
+    os.environ['MARKETDATA_BASE_URL'] = base_url
+    os.environ['YAHOO_BASE_URL'] = base_url
+    os.environ['EARNINGS_DB_PATH'] = os.path.join(workdir, 'bench.db')
+
+    os.environ['MARKETDATA_TOKEN'] = 'bench'
+
+    import browser_pool
+    import config
+    import gateway
+    import providers
+    if not args.rate_limits:
+        config.UPSTREAM_RATE_LIMITS = {p: (1e9, 1e9) for p in config.UPSTREAM_RATE_LIMITS}
+    providers.override('option_client', fakes.FakeOptionClient(faults))
+    providers.override('stock_client', fakes.FakeStockClient(faults))
+    # The fake calendar page always has the table in its HTML; never launch Chrome
+    providers.override('browser_pool', browser_pool.BrowserPool(factory=fakes.no_browser))
+
+    report = {
+        'meta': {
+            'timestamp': dt.datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'latency_ms': args.latency_ms,
+            'failure_rate': args.failure_rate,
+            'workers': args.workers,
+            'api_clients': args.api_clients,
+            'rate_limits': args.rate_limits,
+            'lookback': args.lookback,
+            'lookahead': args.lookahead,
+        },
+        'results': {},
+    }
+    try:
+        for scale in args.scales:
+            tickers = [f"S{i:04d}" for i in range(scale)]
+            print(f"Running scale {scale}...")
+            report['results'][str(scale)] = run_scale(workdir, tickers, args.lookback, args.lookahead, args.workers,
+                                                        args.api_clients)
+        report['gateway'] = gateway.all_stats()
+    finally:
+        server.stop()
+
+    out = out or os.path.join(BENCH_DIR, 'results', f"{report['meta']['timestamp'].replace(':', '')}-{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report['results'], indent=2))
+    print(f"Saved {out}")
+
+    if baseline:
+        with open(baseline) as f:
+            compare(report, json.load(f))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Cross-ticker screening statistics over the performance tables
+
+Summaries per ticker, sector and market-wide are materialized in performance_summary.
+Triggers on the performance tables queue the groups each write touches, and
+refresh_summaries() recomputes only those groups through covering indexes. Market-wide
+groups read every row of a window, so they are recomputed at most every
+config.SUMMARY_MARKET_REFRESH_SEC unless a caller asks for them to be current.
+"""
+from datetime import datetime, timedelta
+import pandas as pd
+import numpy as np
+import config
+import storage
+import telemetry
+
+PHASES = {
+    'pre': ('pre_earnings_performance', 'lookback_days', 'pre_earnings_change'),
+    'post': ('post_earnings_performance', 'lookahead_days', 'post_earnings_change'),
+}
+SCOPES = ('ticker', 'sector', 'all')
+SUMMARY_COLUMNS = ['group_key', 'events', 'mean', 'median', 'p10', 'p25', 'p75', 'p90', 'win_rate', 'updated_at']
+
+def _group_values(conn, scope, group_key, phase, window_days):
+    table, days_col, change_col = PHASES[phase]
+    if scope == 'ticker':
+        query = f'SELECT {change_col} FROM {table} WHERE ticker = ? AND {days_col} = ?'
+        params = (group_key, window_days)
+    elif scope == 'sector':
+        query = f'''SELECT p.{change_col} FROM ticker_sectors s
+                    JOIN {table} p ON p.ticker = s.ticker AND p.{days_col} = ?
+                    WHERE s.sector = ?'''
+        params = (window_days, group_key)
+    else:
+        query = f'SELECT {change_col} FROM {table} WHERE {days_col} = ?'
+        params = (window_days,)
+    values = np.array([row[0] for row in conn.execute(query, params)], dtype=float)
+    return values[~np.isnan(values)]
+
+def summarize(values):
+    """Event count, mean, quantiles and win rate (share of events where the straddle gained) of one group"""
+    p10, p25, median, p75, p90 = np.percentile(values, [10, 25, 50, 75, 90])
+    return {
+        'events': len(values),
+        'mean': float(values.mean()),
+        'median': float(median),
+        'p10': float(p10),
+        'p25': float(p25),
+        'p75': float(p75),
+        'p90': float(p90),
+        'win_rate': float((values > 0).mean()),
+    }
+
+# Queued groups due now: everything but market-wide groups refreshed within the max age
+_DUE_QUERY = '''SELECT scope, group_key, phase, window_days FROM performance_dirty d
+                WHERE d.scope != 'all' OR NOT EXISTS (
+                    SELECT 1 FROM performance_summary s
+                    WHERE s.scope = 'all' AND s.phase = d.phase AND s.window_days = d.window_days
+                    AND s.updated_at > ?)'''
+
+def refresh_summaries(market_max_age=None):
+    """Recompute the summaries queued by writes since the last refresh, returns the number of groups updated
+
+    Market-wide groups refreshed less than market_max_age seconds ago (default
+    config.SUMMARY_MARKET_REFRESH_SEC, 0 to force) stay queued for a later refresh.
+    """
+    market_max_age = config.SUMMARY_MARKET_REFRESH_SEC if market_max_age is None else market_max_age
+    now = datetime.now()
+    cutoff = (now - timedelta(seconds=market_max_age)).isoformat()
+    with telemetry.span('summary_refresh') as span:
+        # Read-only check first, so a refresh with nothing due never takes the write lock
+        due = storage.get_connection().execute(_DUE_QUERY + ' LIMIT 1', (cutoff,)).fetchone()
+        span.hit(due is None)
+        if due is None:
+            return 0
+        with storage.transaction() as conn:
+            dirty = conn.execute(_DUE_QUERY, (cutoff,)).fetchall()
+            _recompute(conn, dirty, now.isoformat())
+    return len(dirty)
+
+def _recompute(conn, dirty, now):
+    for scope, group_key, phase, window_days in dirty:
+        values = _group_values(conn, scope, group_key, phase, window_days)
+        if len(values):
+            stats = summarize(values)
+            conn.execute('''INSERT OR REPLACE INTO performance_summary
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                         (scope, group_key, phase, window_days, *stats.values(), now))
+        else:
+            conn.execute('''DELETE FROM performance_summary
+                            WHERE scope = ? AND phase = ? AND window_days = ? AND group_key = ?''',
+                         (scope, phase, window_days, group_key))
+        conn.execute('''DELETE FROM performance_dirty
+                        WHERE scope = ? AND group_key = ? AND phase = ? AND window_days = ?''',
+                     (scope, group_key, phase, window_days))
+
+def get_windows(phase):
+    """Lookback (pre) or lookahead (post) day counts that have summaries"""
+    conn = storage.get_connection()
+    rows = conn.execute('''SELECT DISTINCT window_days FROM performance_summary
+                           WHERE scope = 'all' AND phase = ? ORDER BY window_days''', (phase,))
+    return [row[0] for row in rows]
+
+def get_summary(scope, phase, window_days, min_events=1, rank_by='median'):
+    """Ranked summaries of one scope for a phase and window, best first"""
+    if rank_by not in SUMMARY_COLUMNS[2:-1]:
+        raise ValueError(f"Cannot rank by {rank_by}")
+    conn = storage.get_connection()
+    rows = conn.execute(f'''SELECT {', '.join(SUMMARY_COLUMNS)} FROM performance_summary
+                            WHERE scope = ? AND phase = ? AND window_days = ? AND events >= ?
+                            ORDER BY {rank_by} DESC''', (scope, phase, window_days, min_events)).fetchall()
+    df = pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+    df.insert(0, 'rank', np.arange(1, len(df) + 1))
+    return df.rename(columns={'group_key': scope})
+
+def set_sectors(mapping):
+    """Assign sectors to tickers ({ticker: sector}); affected sector summaries are queued by triggers"""
+    with storage.transaction() as conn:
+        conn.executemany('''INSERT INTO ticker_sectors VALUES (?, ?)
+                            ON CONFLICT (ticker) DO UPDATE SET sector = excluded.sector
+                            WHERE sector != excluded.sector''',
+                         [(t.upper(), s) for t, s in mapping.items()])
+
+def load_sectors_csv(file):
+    """Read a ticker,sector CSV (path or file object) and store the mapping, returns the number of tickers"""
+    df = pd.read_csv(file)
+    df.columns = [c.strip().lower() for c in df.columns]
+    if not {'ticker', 'sector'} <= set(df.columns):
+        raise ValueError("CSV needs 'ticker' and 'sector' columns")
+    df = df.dropna(subset=['ticker', 'sector'])
+    set_sectors(dict(zip(df['ticker'].astype(str).str.strip(), df['sector'].astype(str).str.strip())))
+    return len(df)
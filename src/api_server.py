@@ -0,0 +1,401 @@
+"""Local HTTP/JSON service for the straddle analytics, for risk tools and notebooks that can't use the dashboard
+
+Built on asyncio streams only: connections are handled on the event loop and the blocking
+event pipelines run on a thread pool. Results come from the same result cache, SQLite stores
+and upstream gateway as the dashboard, and concurrent requests for the same event share one
+computation. The batch endpoint streams one NDJSON line per event as soon as it finishes.
+
+Endpoints:
+    GET  /health
+    GET  /v1/events?ticker=NVDA&lookback=5&lookahead=2&bar_minutes=15&history_days=366&series=0
+    POST /v1/batch   {"tickers": ["NVDA", "AAPL"], "lookback": 5, "lookahead": 2, ...}  -> NDJSON stream
+    GET  /v1/stats
+
+Usage:
+    python src/api_server.py --port 8502
+"""
+import argparse
+import asyncio
+import json
+import logging
+import re
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+import pandas as pd
+import config
+import gateway
+import performance
+import result_cache
+
+logger = logging.getLogger('app_logger')
+
+TICKER_PATTERN = re.compile(r'^[A-Z][A-Z0-9.\-]{0,9}$')
+SERIES_COLUMNS = ['call_close', 'put_close', 'straddle', 'underlying',
+                  'call_iv', 'put_iv', 'implied_move', 'realized_move']
+
+
+class ApiError(Exception):
+    """Request problem reported to the client as {"error": message} with an HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def to_jsonable(value):
+    """Plain JSON types for results: NaN becomes null, dates ISO strings, NumPy values Python ones"""
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray, pd.Series, pd.Index)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+def dumps(payload):
+    return json.dumps(to_jsonable(payload), separators=(',', ':')).encode()
+
+def event_payload(ticker, earnings_date, earnings_time, result, error=None, series=False):
+    """One event as JSON: contract, earnings bar, straddle metrics and implied/realized moves"""
+    payload = {'ticker': ticker, 'earnings_date': earnings_date, 'earnings_time': earnings_time}
+    if error is not None:
+        return {**payload, 'status': 'error', 'error': error}
+    if result is None:
+        return {**payload, 'status': 'no_data'}
+
+    df = result['df']
+    payload.update({
+        'status': 'ok',
+        'symbols': result['symbols'],
+        'strike': result['strike'],
+        'expiry_date': result['expiry_date'],
+        'bars': len(df),
+        'earnings_bar': df['timestamp'].iloc[result['earnings_idx']],
+        'metrics': result['metrics'],
+        'volatility': result['volatility'],
+    })
+    if series:
+        payload['series'] = {'timestamp': df['timestamp'],
+                             **{c: df[c].round(4) for c in SERIES_COLUMNS if c in df}}
+    return payload
+
+
+def parse_settings(params):
+    """Validated pipeline settings from query parameters or a JSON body"""
+    def integer(name, default, low, high):
+        try:
+            value = int(params.get(name, default))
+        except (TypeError, ValueError):
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} must be an integer")
+        if not low <= value <= high:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} must be between {low} and {high}")
+        return value
+
+    settings = {
+        'lookback': integer('lookback', 5, 1, 10),
+        'lookahead': integer('lookahead', 2, 1, 10),
+        'bar_minutes': integer('bar_minutes', 15, 1, 60),
+        'history_days': integer('history_days', 366, 1, 366 * config.MAX_HISTORY_YEARS),
+    }
+    if settings['bar_minutes'] not in config.BAR_RESOLUTIONS.values():
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"bar_minutes must be one of {sorted(config.BAR_RESOLUTIONS.values())}")
+    settings['series'] = str(params.get('series', '0')).lower() in ('1', 'true', 'yes')
+    return settings
+
+def parse_ticker(value):
+    ticker = str(value or '').strip().upper()
+    if not TICKER_PATTERN.match(ticker):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"invalid ticker {value!r}")
+    return ticker
+
+
+class ApiServer:
+    """asyncio HTTP/1.1 server (keep-alive, chunked streaming) in front of the event pipeline"""
+
+    def __init__(self, host=config.API_HOST, port=config.API_PORT, workers=config.API_WORKERS):
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api')
+        self.inflight = gateway.SingleFlight()
+        self.started = time.time()
+        self.stats = {'requests': 0, 'errors': 0, 'events_served': 0, 'coalesced': 0}
+        self._server = None
+        self._connections = {}  # handler task -> writer
+        self._loop = None
+        self._thread = None
+
+    # Lifecycle
+
+    async def serve(self, ready=None):
+        """Accept connections until cancelled; ready (a threading.Event) is set once the port is bound"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"API listening on http://{self.host}:{self.port}")
+        if ready is not None:
+            ready.set()
+        try:
+            await self._server.serve_forever()
+        finally:
+            self._server.close()
+            # Idle keep-alive connections would otherwise outlive the server; closing them ends their handlers
+            for writer in self._connections.values():
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+
+    def start(self):
+        """Serve from a background thread (for notebooks and benchmarks), returns the base URL"""
+        ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._serve_in_thread, args=(ready,), daemon=True)
+        self._thread.start()
+        ready.wait()
+        return f"http://{self.host}:{self.port}"
+
+    def _serve_in_thread(self, ready):
+        try:
+            self._loop.run_until_complete(self.serve(ready))
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def stop(self):
+        if self._loop is not None:
+            # Closing the listener ends serve_forever
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._thread.join(timeout=5)
+            self._loop = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    # Pipeline calls (blocking, run on the executor)
+
+    def _analyze(self, ticker, earnings_date, earnings_time, settings):
+        """analyze_event with concurrent requests for the same event sharing one computation
+
+        Returns (result, shared) like SingleFlight.do.
+        """
+        key = (ticker, earnings_date, settings['lookback'], settings['lookahead'], settings['bar_minutes'])
+        return self.inflight.do(key, lambda: performance.analyze_event(
+            ticker, earnings_date, earnings_time, settings['lookback'], settings['lookahead'], settings['bar_minutes']))
+
+    def _prepare_ticker(self, ticker, settings):
+        """Report dates in the window, with their prices and chains prefetched in bulk"""
+        dates = performance.recent_earnings(ticker, settings['history_days'])
+        performance.warm_caches(ticker, [d for d, _ in dates], settings['lookback'], settings['lookahead'])
+        return dates
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def _ticker_events(self, ticker, settings):
+        """Async iterator of event payloads for one ticker, yielded as each event finishes"""
+        try:
+            dates = await self._run(self._prepare_ticker, ticker, settings)
+        except Exception as e:
+            logger.error(f"Could not get earnings dates for {ticker}: {str(e)}")
+            yield {'ticker': ticker, 'status': 'error', 'error': f"earnings dates: {str(e)}"}
+            return
+        if not dates:
+            # One line per ticker even without reports, so batch clients can account for every ticker
+            yield {'ticker': ticker, 'status': 'no_data'}
+            return
+
+        async def one(earnings_date, earnings_time):
+            try:
+                result, shared = await self._run(self._analyze, ticker, earnings_date, earnings_time, settings)
+                self.stats['coalesced'] += shared
+                return event_payload(ticker, earnings_date, earnings_time, result, series=settings['series'])
+            except Exception as e:
+                logger.error(f"Error for {ticker} {earnings_date}: {str(e)}")
+                logger.debug(traceback.format_exc())
+                return event_payload(ticker, earnings_date, earnings_time, None, error=str(e))
+
+        for next_done in asyncio.as_completed([one(d, t) for d, t in dates]):
+            payload = await next_done
+            self.stats['events_served'] += 1
+            yield payload
+
+    # Routes
+
+    async def health(self, query, body, writer):
+        await self._send_json(writer, HTTPStatus.OK, {'status': 'ok', 'uptime_sec': round(time.time() - self.started, 1)})
+
+    async def events(self, query, body, writer):
+        ticker = parse_ticker(query.get('ticker'))
+        settings = parse_settings(query)
+        events = [payload async for payload in self._ticker_events(ticker, settings)]
+        events.sort(key=lambda e: str(e.get('earnings_date', '')), reverse=True)
+        await self._send_json(writer, HTTPStatus.OK, {'ticker': ticker, **settings, 'events': events})
+
+    async def batch(self, query, body, writer):
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "body must be JSON")
+        if not isinstance(request, dict) or not isinstance(request.get('tickers'), list) or not request['tickers']:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "body must be an object with a non-empty tickers list")
+        if len(request['tickers']) > config.API_MAX_BATCH_TICKERS:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"at most {config.API_MAX_BATCH_TICKERS} tickers per batch")
+        tickers = list(dict.fromkeys(parse_ticker(t) for t in request['tickers']))
+        settings = parse_settings(request)
+
+        # Every ticker's events interleave into one stream in completion order
+        start = time.perf_counter()
+        queue = asyncio.Queue()
+
+        async def pump(ticker):
+            async for payload in self._ticker_events(ticker, settings):
+                await queue.put(payload)
+
+        pumps = [asyncio.ensure_future(pump(t)) for t in tickers]
+        done_all = asyncio.ensure_future(asyncio.gather(*pumps, return_exceptions=True))
+        done_all.add_done_callback(lambda _: queue.put_nowait(None))
+
+        counts = {'ok': 0, 'no_data': 0, 'error': 0}
+        await self._start_stream(writer)
+        try:
+            while (payload := await queue.get()) is not None:
+                counts[payload['status']] += 1
+                await self._write_chunk(writer, dumps(payload) + b'\n')
+            summary = {'done': True, 'tickers': len(tickers), 'events': counts,
+                       'elapsed_sec': round(time.perf_counter() - start, 3)}
+            await self._write_chunk(writer, dumps(summary) + b'\n')
+            await self._write_chunk(writer, b'')
+        finally:
+            # A client that hangs up mid-stream leaves nothing running for it
+            for task in pumps:
+                task.cancel()
+
+    async def stats_route(self, query, body, writer):
+        await self._send_json(writer, HTTPStatus.OK, {
+            'server': {**self.stats, 'uptime_sec': round(time.time() - self.started, 1)},
+            'result_cache': result_cache.results.stats(),
+            'gateway': gateway.all_stats(),
+        })
+
+    ROUTES = {
+        ('GET', '/health'): health,
+        ('GET', '/v1/events'): events,
+        ('POST', '/v1/batch'): batch,
+        ('GET', '/v1/stats'): stats_route,
+    }
+
+    # HTTP plumbing
+
+    async def _handle_connection(self, reader, writer):
+        self._connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                request = await self._read_request(reader, writer)
+                if request is None:
+                    break
+                method, path, query, headers, body = request
+                await self._dispatch(method, path, query, body, writer)
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def _read_request(self, reader, writer):
+        """(method, path, query, headers, body) of the next request, None when the client is done"""
+        try:
+            line = await reader.readline()
+            if not line.strip():
+                return None
+            headers = {}
+            while (header := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                name, _, value = header.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+        except (asyncio.LimitOverrunError, ValueError):
+            # readline raises ValueError once a line outgrows the stream buffer limit
+            await self._send_json(writer, HTTPStatus.BAD_REQUEST, {'error': 'request line or header too long'})
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split()
+        except ValueError:
+            await self._send_json(writer, HTTPStatus.BAD_REQUEST, {'error': 'malformed request line'})
+            return None
+
+        try:
+            length = int(headers.get('content-length') or 0)
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            await self._send_json(writer, HTTPStatus.BAD_REQUEST, {'error': 'invalid Content-Length'})
+            return None
+        if length > config.API_MAX_BODY_BYTES:
+            await self._send_json(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': 'request body too large'})
+            return None
+        body = await reader.readexactly(length) if length else b''
+
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        return method.upper(), url.path.rstrip('/') or '/', query, headers, body
+
+    async def _dispatch(self, method, path, query, body, writer):
+        self.stats['requests'] += 1
+        route = self.ROUTES.get((method, path))
+        try:
+            if route is None:
+                known = any(p == path for _, p in self.ROUTES)
+                raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED if known else HTTPStatus.NOT_FOUND, f"no route for {method} {path}")
+            await route(self, query, body, writer)
+        except ApiError as e:
+            self.stats['errors'] += 1
+            await self._send_json(writer, e.status, {'error': str(e)})
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"{method} {path} failed: {str(e)}")
+            logger.debug(traceback.format_exc())
+            await self._send_json(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)})
+
+    async def _send_json(self, writer, status, payload):
+        body = dumps(payload)
+        writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                     f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def _start_stream(self, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\nCache-Control: no-cache\r\n\r\n")
+        await writer.drain()
+
+    async def _write_chunk(self, writer, data):
+        """One chunk of a chunked response; empty data ends the response"""
+        writer.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the straddle analytics as a local JSON API")
+    parser.add_argument('--host', default=config.API_HOST)
+    parser.add_argument('--port', type=int, default=config.API_PORT)
+    parser.add_argument('--workers', type=int, default=config.API_WORKERS, help="Threads running event pipelines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = ApiServer(args.host, args.port, args.workers)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown(wait=False, cancel_futures=True)
+
+if __name__ == '__main__':
+    main()
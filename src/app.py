@@ -1,11 +1,17 @@
 import streamlit as st
-import plotly.graph_objects as go
 import get_earnings_dates
-import get_options
+import performance
+import analytics
+import event_study
+import charts
+import result_cache
+import telemetry
+import gateway
+import config
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import logging
 import traceback
-import pandas as pd
 import sqlite3
 import os
 import tempfile
@@ -16,6 +22,7 @@ st.set_page_config(page_title="Earnings Straddle Dashboard", layout="wide")
 log_file = os.path.join(tempfile.gettempdir(), 'earnings_dashboard.log')
 if 'log_initialized' not in st.session_state:
     open(log_file, 'w').close()
+    telemetry.clear_logs()
     st.session_state.log_initialized = True
 
 handler = logging.FileHandler(log_file, mode='a')
@@ -23,40 +30,10 @@ handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)
 logger = logging.getLogger('app_logger')
 logger.handlers.clear()
 logger.addHandler(handler)
+logger.addHandler(telemetry.log_handler)  # in-memory buffer read by the Logs tab
 logger.setLevel(logging.DEBUG)
 logger.propagate = False
 
-# Initialize database
-def init_performance_db():
-    conn = sqlite3.connect('earnings.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS pre_earnings_performance
-                 (ticker TEXT, earnings_date DATE, lookback_days INTEGER, pre_earnings_change REAL, 
-                  logged_at TIMESTAMP, PRIMARY KEY (ticker, earnings_date, lookback_days))''')
-    c.execute('''CREATE TABLE IF NOT EXISTS post_earnings_performance
-                 (ticker TEXT, earnings_date DATE, lookahead_days INTEGER, post_earnings_change REAL, 
-                  logged_at TIMESTAMP, PRIMARY KEY (ticker, earnings_date, lookahead_days))''')
-    conn.commit()
-    conn.close()
-
-def log_pre_earnings(ticker, earnings_date, lookback_days, pre_earnings_change):
-    conn = sqlite3.connect('earnings.db')
-    c = conn.cursor()
-    c.execute('''INSERT OR REPLACE INTO pre_earnings_performance VALUES (?, ?, ?, ?, ?)''',
-              (ticker, str(earnings_date), lookback_days, pre_earnings_change, datetime.now().isoformat()))
-    conn.commit()
-    conn.close()
-
-def log_post_earnings(ticker, earnings_date, lookahead_days, post_earnings_change):
-    conn = sqlite3.connect('earnings.db')
-    c = conn.cursor()
-    c.execute('''INSERT OR REPLACE INTO post_earnings_performance VALUES (?, ?, ?, ?, ?)''',
-              (ticker, str(earnings_date), lookahead_days, post_earnings_change, datetime.now().isoformat()))
-    conn.commit()
-    conn.close()
-
-init_performance_db()
-
 
 st.title("Earnings Straddle Performance Dashboard")
 st.markdown("Analyze straddle performance around earnings dates")
@@ -67,11 +44,22 @@ with st.sidebar:
     ticker = st.text_input("Stock Symbol", value="NVDA").upper()
     lookback = st.number_input("Days Before Earnings", min_value=1, max_value=10, value=5)
     lookahead = st.number_input("Days After Earnings", min_value=1, max_value=10, value=2)
+    resolution = st.selectbox("Bar Resolution", list(config.BAR_RESOLUTIONS), index=list(config.BAR_RESOLUTIONS).index("15 min"))
+    bar_minutes = config.BAR_RESOLUTIONS[resolution]
+    history_years = st.number_input("Years of History", min_value=1, max_value=config.MAX_HISTORY_YEARS, value=1)
+    study_mode = st.toggle("Event Study", value=False, help="Overlay every event aligned on the earnings bar instead of one chart per event")
+    ladder_mode = st.toggle("Strike Ladder", value=False, help="Compare the straddle with strangles and butterflies on nearby strikes")
+    ladder_width = st.number_input("Strikes Each Side", min_value=1, max_value=config.LADDER_MAX_WIDTH,
+                                   value=config.LADDER_DEFAULT_WIDTH, disabled=not ladder_mode)
     
     fetch_button = st.button("Fetch Data", type="primary")
+    
+    cache_stats = result_cache.results.stats()
+    st.caption(f"Result cache: {cache_stats['entries']} events, {cache_stats['bytes'] / 1e6:.1f} MB | "
+               f"{cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%})")
 
 # Tabs
-tab1, tab2 = st.tabs(["Dashboard", "Logs"])
+tab1, tab2, tab3, tab4 = st.tabs(["Dashboard", "Logs", "Performance", "Screener"])
 
 with tab1:
     if fetch_button:
@@ -82,24 +70,25 @@ with tab1:
             with st.spinner(f"Fetching earnings dates for {ticker}..."):
                 try:
                     logger.info(f"Fetching earnings dates for {ticker}")
-                    dates = get_earnings_dates.get_past_earnings_dates(ticker)
+                    years = max(5, history_years)
+                    dates = get_earnings_dates.get_past_earnings_dates(ticker, limit=years * 4, years=years)
                     
                     if not dates:
                         st.error("No earnings dates found")
                         logger.error(f"No earnings dates found for {ticker}")
                         st.stop()
                     
-                    # Filter dates to the past 1 year
-                    cutoff_date = datetime.today().date() - timedelta(days=366)
+                    # Filter dates to the chosen history
+                    cutoff_date = datetime.today().date() - timedelta(days=365 * history_years + 1)
                     filtered_dates = [(d, t) for d, t in dates if d > cutoff_date]
                     earning_dates_str = ',  '.join([str(d) for d, _ in filtered_dates])
                     
                     if not filtered_dates:
-                        st.error("No earnings dates found in the past one year")
+                        st.error(f"No earnings dates found in the past {history_years} year(s)")
                         logger.error("No earnings dates after cutoff")
                         st.stop()
                     
-                    st.success(f"Found {len(filtered_dates)} earnings dates in the past 1 year: {earning_dates_str}")
+                    st.success(f"Found {len(filtered_dates)} earnings dates in the past {history_years} year(s): {earning_dates_str}")
                     logger.info(f"Processing {len(filtered_dates)} earnings dates")
                 
                 except Exception as e:
@@ -108,153 +97,149 @@ with tab1:
                     logger.debug(traceback.format_exc())
                     st.stop()
             
-            # Process each earnings date
-            for idx, (earnings_date, earnings_time) in enumerate(filtered_dates):
-                with st.spinner(f"Fetching options data for {earnings_date}..."):
-                    try:
-                        logger.info(f"Processing earnings date {idx+1}/{len(filtered_dates)}: {earnings_date}")
-                        df, symbols = get_options.get_options_data(ticker, earnings_date, lookback, lookahead)
+            # Warm the 9:45 price and chain caches for all events (failures resurface per event below)
+            performance.warm_caches(ticker, [d for d, _ in filtered_dates], lookback, lookahead)
+            
+            # Fetch every earnings event in parallel, bounded to stay within API quotas
+            def fetch_event(earnings_date, earnings_time):
+                logger.info(f"Fetching options data for {earnings_date}")
+                if ladder_mode and not study_mode:
+                    return performance.analyze_ladder(ticker, earnings_date, earnings_time, lookback, lookahead,
+                                                      ladder_width, bar_minutes)
+                return performance.analyze_event(ticker, earnings_date, earnings_time, lookback, lookahead, bar_minutes)
+            
+            executor = ThreadPoolExecutor(max_workers=config.FETCH_WORKERS)
+            try:
+                futures = [executor.submit(fetch_event, d, t) for d, t in filtered_dates]
+            
+                study_events = []
+            
+                # Process each earnings date in date order as its fetch finishes
+                for idx, ((earnings_date, earnings_time), future) in enumerate(zip(filtered_dates, futures)):
+                    with st.spinner(f"Fetching options data for {earnings_date}..."):
+                        try:
+                            logger.info(f"Processing earnings date {idx+1}/{len(filtered_dates)}: {earnings_date}")
+                            result = future.result()
                     
-                        if df is None or df.empty:
-                            st.warning(f"No options data found for {earnings_date}")
-                            logger.warning(f"No options data for {earnings_date}")
-                            continue
-                        
-                        logger.info(f"Successfully fetched {len(df)} data points")
+                            if result is None:
+                                st.warning(f"No options data found for {earnings_date}")
+                                logger.warning(f"No options data for {earnings_date}")
+                                continue
                         
-                        # Convert timestamps to EST and drop rows with missing data
-                        df['timestamp'] = pd.to_datetime(df['timestamp']).dt.tz_convert('US/Eastern')
-                        df = df.dropna(subset=['call_close', 'put_close', 'straddle'])
-                        logger.info(f"After filtering: {len(df)} valid data points")
+                            df = result['df']
+                            earnings_idx = result['earnings_idx']
                         
-                        # Create numerical index and format timestamp labels
-                        df = df.reset_index(drop=True)
-                        df['timestamp_label'] = df['timestamp'].dt.strftime('%m/%d %H:%M')
+                            if study_mode:
+                                # Charted together after the loop
+                                study_events.append((earnings_date, df['straddle'].to_numpy(), earnings_idx))
+                                continue
                         
-                        # Find earnings index based on timing (before = 9:30, after = 16:00)
-                        earnings_hour = 9 if earnings_time == 'before' else 16
-                        earnings_minute = 30 if earnings_time == 'before' else 0
+                            if ladder_mode:
+                                strikes = ', '.join(f"${k:g}" for k in result['strikes'])
+                                st.info(f"Earnings: {earnings_date} ({earnings_time} market) | Strikes: {strikes} (ATM ${result['atm_strike']:g}) | Expiry: {result['expiry_date']}")
+                            
+                                with telemetry.span('chart_render', ticker=ticker, event=str(earnings_date)):
+                                    fig = charts.build_ladder_figure(df, result['structures'], earnings_idx, f"{ticker} strike ladder - {earnings_date}")
+                                    st.plotly_chart(fig, use_container_width=True)
+                            
+                                # Structures scored like the straddle, best post-earnings change first
+                                scores = result['scores']
+                                st.dataframe(scores.sort_values('post_earnings_change', ascending=False).round(2), use_container_width=True)
+                            
+                                if 'Straddle' in scores.index:
+                                    straddle = scores.loc['Straddle']
+                                    performance.log_pre_earnings(ticker, earnings_date, lookback, straddle['pre_earnings_change'])
+                                    performance.log_post_earnings(ticker, earnings_date, lookahead, straddle['post_earnings_change'])
+                            
+                                st.divider()
+                                continue
                         
-                        earnings_datetime = pd.Timestamp(datetime.combine(earnings_date, datetime.min.time()).replace(hour=earnings_hour, minute=earnings_minute)).tz_localize('US/Eastern')
-                        earnings_idx = (df['timestamp'] - earnings_datetime).abs().idxmin()
+                            strike = result['strike']
+                            expiry_date = result['expiry_date']
                         
-                        # Get strike and expiry from symbols
-                        if symbols:
-                            call_symbol = symbols[0]
-                            strike = int(call_symbol[-8:]) / 1000
-                            expiry_str = call_symbol[len(ticker):len(ticker)+6]
-                            expiry_date = datetime.strptime(expiry_str, '%y%m%d').strftime('%Y-%m-%d')
-                        else:
-                            strike = 'N/A'
-                            expiry_date = 'N/A'
+                            # Display earnings info
+                            st.info(f"Earnings: {earnings_date} ({earnings_time} market) | Strike: ${strike} | Expiry: {expiry_date}")
                         
-                        # Display earnings info
-                        st.info(f"Earnings: {earnings_date} ({earnings_time} market) | Strike: ${strike} | Expiry: {expiry_date}")
+                            # Create interactive chart (downsampled for display, metrics use every bar)
+                            with telemetry.span('chart_render', ticker=ticker, event=str(earnings_date)):
+                                fig = charts.build_straddle_figure(df, earnings_idx, f"{ticker} ${strike} - {earnings_date}")
+                                st.plotly_chart(fig, use_container_width=True)
                         
-                        # Create interactive chart
-                        fig = go.Figure()
+                            # Display metrics
+                            metrics = result['metrics']
                         
-                        # Add call trace (faint green)
-                        fig.add_trace(go.Scatter(
-                            x=df.index,
-                            y=df['call_close'],
-                            mode='lines',
-                            name='Call',
-                            line=dict(color='rgba(0, 255, 0, 0.3)', width=1.5),
-                            text=df['timestamp_label'],
-                            hovertemplate='%{text}<br>Call: $%{y:.2f}<extra></extra>'
-                        ))
+                            col1, col2, col3, col4 = st.columns(4)
                         
-                        # Add put trace (faint red)
-                        fig.add_trace(go.Scatter(
-                            x=df.index,
-                            y=df['put_close'],
-                            mode='lines',
-                            name='Put',
-                            line=dict(color='rgba(255, 0, 0, 0.3)', width=1.5),
-                            text=df['timestamp_label'],
-                            hovertemplate='%{text}<br>Put: $%{y:.2f}<extra></extra>'
-                        ))
-                        
-                        # Add straddle trace (solid blue)
-                        fig.add_trace(go.Scatter(
-                            x=df.index,
-                            y=df['straddle'],
-                            mode='lines',
-                            name='Straddle',
-                            line=dict(color='#1f77b4', width=2),
-                            text=df['timestamp_label'],
-                            hovertemplate='%{text}<br>Straddle: $%{y:.2f}<extra></extra>'
-                        ))
-                        
-                        # Add earnings date vertical line
-                        fig.add_shape(
-                            type="line",
-                            x0=earnings_idx, x1=earnings_idx,
-                            y0=0, y1=1,
-                            yref="paper",
-                            line=dict(color="red", width=2, dash="dash")
-                        )
-                        fig.add_annotation(
-                            x=earnings_idx,
-                            y=1,
-                            yref="paper",
-                            text="Earnings",
-                            showarrow=False,
-                            yshift=10
-                        )
-                        
-                        # Configure x-axis with timestamp labels
-                        tick_indices = list(range(0, len(df), max(1, len(df)//10)))
-                        tick_labels = [df.loc[i, 'timestamp_label'] for i in tick_indices]
+                            with col1:
+                                st.metric("Initial Straddle", f"${metrics['initial_straddle']:.2f}")
+                            with col2:
+                                st.metric("Pre-Earnings", f"${metrics['pre_earnings_straddle']:.2f}", delta=f"{metrics['pre_earnings_change']:.2f}%")
+                            with col3:
+                                st.metric("Post-Earnings", f"${metrics['final_straddle']:.2f}", delta=f"{metrics['post_earnings_change']:.2f}%")
+                            with col4:
+                                st.metric("Total Change", f"{metrics['total_change']:.2f}%")
+
+                            # Implied volatility and the straddle-implied move against the realized one
+                            volatility = result['volatility']
+
+                            col1, col2, col3, col4 = st.columns(4)
+
+                            with col1:
+                                st.metric("Pre-Earnings IV", f"{volatility['pre_earnings_iv']:.1f}%")
+                            with col2:
+                                st.metric("Final IV", f"{volatility['final_iv']:.1f}%", delta=f"{volatility['iv_change']:.1f} pts")
+                            with col3:
+                                st.metric("Implied Move", f"±{volatility['implied_move']:.2f}%")
+                            with col4:
+                                st.metric("Realized Move", f"{volatility['realized_move']:.2f}%",
+                                          delta=f"{volatility['move_ratio']:.2f}x implied", delta_color="off")
+
+                            with st.expander("Implied Volatility"):
+                                with telemetry.span('chart_render', ticker=ticker, event=str(earnings_date)):
+                                    fig = charts.build_volatility_figure(df, earnings_idx, f"{ticker} ${strike} IV - {earnings_date}")
+                                    st.plotly_chart(fig, use_container_width=True)
+
+                            # Log performance to database
+                            performance.log_pre_earnings(ticker, earnings_date, lookback, metrics['pre_earnings_change'])
+                            performance.log_post_earnings(ticker, earnings_date, lookahead, metrics['post_earnings_change'])
                         
-                        fig.update_layout(
-                            title=f"{ticker} ${strike} - {earnings_date}",
-                            xaxis_title="Date/Time (EST)",
-                            yaxis_title="Price ($)",
-                            hovermode='closest',
-                            height=500,
-                            template="plotly_white",
-                            xaxis=dict(
-                                tickmode='array',
-                                tickvals=tick_indices,
-                                ticktext=tick_labels
-                            )
-                        )
+                            st.divider()
                         
+                        except Exception as e:
+                            st.error(f"Error for {earnings_date}: {str(e)}")
+                            logger.error(f"Error for {earnings_date}: {str(e)}")
+                            logger.debug(traceback.format_exc())
+                            continue
+            finally:
+                # st.stop(), errors and reruns also land here: drop queued events, let running ones finish in the background
+                executor.shutdown(wait=False, cancel_futures=True)
+            
+            if study_mode:
+                study = event_study.run_study(study_events)
+                if study is None:
+                    st.warning("No events with options data to study")
+                else:
+                    with telemetry.span('chart_render', ticker=ticker):
+                        fig = charts.build_event_study_figure(study, bar_minutes, f"{ticker} straddle around {len(study['labels'])} earnings events")
                         st.plotly_chart(fig, use_container_width=True)
-                        
-                        # Display metrics
-                        initial_straddle = df['straddle'].iloc[0]
-                        pre_earnings_straddle = df['straddle'].iloc[earnings_idx - 1]
-                        final_straddle = df['straddle'].iloc[-1]
-                        
-                        pre_earnings_change = ((pre_earnings_straddle - initial_straddle) / initial_straddle) * 100
-                        post_earnings_change = ((final_straddle - pre_earnings_straddle) / pre_earnings_straddle) * 100
-                        
-                        col1, col2, col3, col4 = st.columns(4)
-                        
-                        with col1:
-                            st.metric("Initial Straddle", f"${initial_straddle:.2f}")
-                        with col2:
-                            st.metric("Pre-Earnings", f"${pre_earnings_straddle:.2f}", delta=f"{pre_earnings_change:.2f}%")
-                        with col3:
-                            st.metric("Post-Earnings", f"${final_straddle:.2f}", delta=f"{post_earnings_change:.2f}%")
-                        with col4:
-                            total_change = ((final_straddle - initial_straddle) / initial_straddle) * 100
-                            st.metric("Total Change", f"{total_change:.2f}%")
-                        
-                        # Log performance to database
-                        log_pre_earnings(ticker, earnings_date, lookback, pre_earnings_change)
-                        log_post_earnings(ticker, earnings_date, lookahead, post_earnings_change)
-                        
-                        st.divider()
-                        
-                    except Exception as e:
-                        st.error(f"Error for {earnings_date}: {str(e)}")
-                        logger.error(f"Error for {earnings_date}: {str(e)}")
-                        logger.debug(traceback.format_exc())
-                        continue
+                    
+                    metrics = study['metrics']
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1:
+                        st.metric("Events", len(metrics))
+                    with col2:
+                        st.metric("Median Pre-Earnings Change", f"{metrics['pre_earnings_change'].median():.2f}%")
+                    with col3:
+                        st.metric("Median Post-Earnings Change", f"{metrics['post_earnings_change'].median():.2f}%")
+                    with col4:
+                        st.metric("Post-Earnings Win Rate", f"{(metrics['post_earnings_change'] > 0).mean():.0%}")
+                    st.dataframe(metrics.round(2), use_container_width=True)
+                    
+                    # Log performance to database
+                    logged = metrics.dropna(subset=['pre_earnings_change', 'post_earnings_change'])
+                    performance.save_performance_rows(
+                        [(ticker, d, lookback, change) for d, change in logged['pre_earnings_change'].items()],
+                        [(ticker, d, lookahead, change) for d, change in logged['post_earnings_change'].items()])
     else:
         st.info("Enter parameters in the sidebar and click 'Fetch Data' to begin")
 
@@ -277,15 +262,69 @@ with tab2:
     </style>
     """, unsafe_allow_html=True)
     
-    if os.path.exists(log_file):
-        with open(log_file, 'r') as f:
-            log_content = f.read()
-        if log_content:
-            if not debug_mode:
-                filtered_lines = [line for line in log_content.split('\n') if '- DEBUG -' not in line]
-                log_content = '\n'.join(filtered_lines)
-            st.markdown(f'<div class="logs-display">{log_content}</div>', unsafe_allow_html=True)
-        else:
-            st.markdown('<div class="logs-display">No logs yet. Click \'Fetch Data\' to see logs.</div>', unsafe_allow_html=True)
+    log_lines = telemetry.recent_logs(logging.DEBUG if debug_mode else logging.INFO)
+    if log_lines:
+        log_content = '\n'.join(log_lines)
+        st.markdown(f'<div class="logs-display">{log_content}</div>', unsafe_allow_html=True)
     else:
         st.markdown('<div class="logs-display">No logs yet. Click \'Fetch Data\' to see logs.</div>', unsafe_allow_html=True)
+
+with tab3:
+    st.subheader("Pipeline Stage Latency")
+    summary = telemetry.stage_summary()
+    if summary.empty:
+        st.info("No timings recorded yet. Click 'Fetch Data' to collect some.")
+    else:
+        st.dataframe(summary, use_container_width=True)
+        st.bar_chart(summary[['p50_ms', 'p95_ms']])
+        
+        st.subheader("Recent Spans")
+        st.dataframe(telemetry.recent_spans()[-100:][::-1], use_container_width=True)
+    
+    cache_stats = result_cache.results.stats()
+    st.subheader("Result Cache")
+    st.json(cache_stats)
+    
+    st.subheader("Upstream Gateway")
+    st.json(gateway.all_stats())
+
+with tab4:
+    st.subheader("Straddle Screener")
+    try:
+        analytics.refresh_summaries()  # only the groups written since the last refresh are recomputed
+    except sqlite3.OperationalError as e:
+        # Another process (batch, scheduler) holds the write lock; the stored summaries are still readable
+        st.caption(f"Showing the last stored summaries ({str(e)})")
+        logger.warning(f"Summary refresh skipped: {str(e)}")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        scope = st.selectbox("Group By", analytics.SCOPES, format_func=str.title)
+    with col2:
+        phase = st.selectbox("Phase", list(analytics.PHASES), format_func=lambda p: "Pre-earnings" if p == 'pre' else "Post-earnings")
+    windows = analytics.get_windows(phase)
+    with col3:
+        window_days = st.selectbox("Days Before" if phase == 'pre' else "Days After", windows)
+    with col4:
+        min_events = st.number_input("Min Events", min_value=1, value=3 if scope == 'ticker' else 1)
+    rank_by = st.radio("Rank By", ['median', 'mean', 'win_rate', 'p25', 'p75'], horizontal=True)
+    
+    if not windows:
+        st.info("No performance data stored yet. Fetch some tickers or run batch mode first.")
+    else:
+        ranking = analytics.get_summary(scope, phase, window_days, min_events, rank_by)
+        if ranking.empty:
+            st.info("No groups with enough events for these settings")
+        else:
+            st.dataframe(ranking.set_index('rank').round(2), use_container_width=True)
+    
+    with st.expander("Sectors"):
+        sector_file = st.file_uploader("Import ticker,sector CSV", type="csv")
+        if sector_file is not None and st.button("Import Sectors"):
+            try:
+                count = analytics.load_sectors_csv(sector_file)
+                st.success(f"Assigned sectors for {count} tickers")
+                logger.info(f"Imported sectors for {count} tickers")
+            except Exception as e:
+                st.error(f"Error importing sectors: {str(e)}")
+                logger.error(f"Error importing sectors: {str(e)}")
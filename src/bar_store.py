@@ -0,0 +1,172 @@
+"""Local option and stock bar store: bars live in SQLite and only the missing sub-ranges are fetched from Alpaca"""
+from datetime import datetime, timezone
+import pandas as pd
+import storage
+import telemetry
+import gateway
+import providers
+import logging
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'trade_count', 'vwap']
+# Alpaca's compact field names for each bar column
+RAW_FIELDS = {'t': 'timestamp', 'o': 'open', 'h': 'high', 'l': 'low', 'c': 'close',
+              'v': 'volume', 'n': 'trade_count', 'vw': 'vwap'}
+# (bars table, covered ranges table) per instrument kind
+TABLES = {'option': ('option_bars', 'option_bar_ranges'),
+          'stock': ('stock_bars', 'stock_bar_ranges')}
+
+def get_option_bars(symbols, start, end, timeframe_minutes=15):
+    """Get bars for the symbols between start and end, fetching only what isn't stored yet"""
+    with telemetry.span('option_bars', contracts=len(symbols)) as span:
+        return _get_bars('option', symbols, start, end, timeframe_minutes, span)
+
+def get_stock_bars(tickers, start, end, timeframe_minutes=15):
+    """Underlying bars for the tickers between start and end, stored and gap-filled like option bars"""
+    with telemetry.span('stock_bars', tickers=len(tickers)) as span:
+        return _get_bars('stock', tickers, start, end, timeframe_minutes, span)
+
+def _get_bars(kind, symbols, start, end, timeframe_minutes, span):
+    start = _to_utc_str(start)
+    end = _to_utc_str(end)
+
+    # Group symbols that miss exactly the same sub-ranges so each gap is one multi-symbol request
+    gaps_by_symbol = {}
+    for symbol in symbols:
+        covered = get_covered_ranges(symbol, timeframe_minutes, kind)
+        for gap in _missing_ranges(start, end, covered):
+            gaps_by_symbol.setdefault(gap, []).append(symbol)
+    span.hit(not gaps_by_symbol)
+
+    fetch = _fetch_bars if kind == 'option' else _fetch_stock_bars
+    for (gap_start, gap_end), gap_symbols in gaps_by_symbol.items():
+        logging.info(f"Fetching {len(gap_symbols)} {kind} symbols from {gap_start} to {gap_end}")
+        bars = fetch(gap_symbols, gap_start, gap_end, timeframe_minutes)
+        save_bars(bars, timeframe_minutes, kind)
+        for symbol in gap_symbols:
+            final_end = _final_range_end(symbol, gap_end) if kind == 'option' else _today_cutoff(gap_end)
+            if final_end > gap_start:
+                add_covered_range(symbol, timeframe_minutes, gap_start, final_end, kind)
+
+    return load_bars(symbols, start, end, timeframe_minutes, kind)
+
+
+def _to_utc_str(value):
+    return pd.Timestamp(value).tz_convert('UTC').isoformat()
+
+def _missing_ranges(start, end, covered):
+    """Sub-ranges of [start, end] not included in the sorted covered ranges"""
+    missing = []
+    cursor = start
+    for range_start, range_end in covered:
+        if range_end < cursor:
+            continue
+        if range_start > end:
+            break
+        if range_start > cursor:
+            missing.append((cursor, range_start))
+        cursor = max(cursor, range_end)
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+def _final_range_end(symbol, range_end):
+    """Bars are final for expired contracts; otherwise only up to the start of today"""
+    expiry = datetime.strptime(symbol[-15:-9], '%y%m%d').date()
+    if expiry < datetime.now(timezone.utc).date():
+        return range_end
+    return _today_cutoff(range_end)
+
+def _today_cutoff(range_end):
+    """Bars before today are final, later ones may still change"""
+    today = datetime.now(timezone.utc).date()
+    return min(range_end, pd.Timestamp(today, tz='UTC').isoformat())
+
+def _timeframe(timeframe_minutes):
+    from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+
+    if timeframe_minutes % 60 == 0:
+        return TimeFrame(timeframe_minutes // 60, TimeFrameUnit('Hour'))
+    return TimeFrame(timeframe_minutes, TimeFrameUnit('Min'))
+
+def _fetch_bars(symbols, start, end, timeframe_minutes):
+    """Fetch every bar in the range as one columnar frame
+
+    No limit is set, so the client follows next_page_token through the whole result
+    (up to 10,000 bars per page) instead of silently truncating.
+    """
+    from alpaca.data.historical.option import OptionBarsRequest
+
+    req = OptionBarsRequest(symbol_or_symbols=symbols,
+                            start=start,
+                            end=end,
+                            timeframe=_timeframe(timeframe_minutes))
+    key = ('option_bars', tuple(symbols), start, end, timeframe_minutes)
+    data = gateway.get('alpaca').call(key, lambda: providers.get('option_client').get_option_bars(req))
+    return bars_to_frame(data)
+
+def _fetch_stock_bars(tickers, start, end, timeframe_minutes):
+    """Underlying bars in the range as one columnar frame"""
+    from alpaca.data.requests import StockBarsRequest
+
+    req = StockBarsRequest(symbol_or_symbols=tickers,
+                           start=pd.Timestamp(start),
+                           end=pd.Timestamp(end),
+                           timeframe=_timeframe(timeframe_minutes))
+    key = ('stock_bars', tuple(tickers), start, end, timeframe_minutes)
+    data = gateway.get('alpaca').call(key, lambda: providers.get('stock_client').get_stock_bars(req))
+    return bars_to_frame(data)
+
+def bars_to_frame(data):
+    """Raw {symbol: [bar, ...]} response to a symbol/timestamp/OHLCV frame"""
+    frames = [pd.DataFrame.from_records(bars).assign(symbol=symbol) for symbol, bars in data.items() if bars]
+    if not frames:
+        return pd.DataFrame(columns=['symbol', 'timestamp'] + BAR_COLUMNS)
+    df = pd.concat(frames, ignore_index=True).rename(columns=RAW_FIELDS)
+    for col in BAR_COLUMNS:
+        if col not in df:
+            df[col] = None
+    return df[['symbol', 'timestamp'] + BAR_COLUMNS]
+
+
+def get_covered_ranges(symbol, timeframe_minutes, kind='option'):
+    conn = storage.get_connection()
+    c = conn.execute(f'''SELECT range_start, range_end FROM {TABLES[kind][1]}
+                        WHERE symbol = ? AND timeframe = ? ORDER BY range_start''',
+                     (symbol, timeframe_minutes))
+    return c.fetchall()
+
+def add_covered_range(symbol, timeframe_minutes, range_start, range_end, kind='option'):
+    """Merge a fetched range into the symbol's coverage, collapsing overlaps"""
+    ranges_table = TABLES[kind][1]
+    with storage.transaction() as conn:
+        ranges = sorted(get_covered_ranges(symbol, timeframe_minutes, kind) + [(range_start, range_end)])
+        merged = [list(ranges[0])]
+        for s, e in ranges[1:]:
+            if s <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], e)
+            else:
+                merged.append([s, e])
+
+        conn.execute(f'''DELETE FROM {ranges_table} WHERE symbol = ? AND timeframe = ?''', (symbol, timeframe_minutes))
+        conn.executemany(f'''INSERT INTO {ranges_table} VALUES (?, ?, ?, ?)''',
+                         [(symbol, timeframe_minutes, s, e) for s, e in merged])
+
+def save_bars(bars, timeframe_minutes, kind='option'):
+    if bars.empty:
+        return
+    df = bars.copy()
+    df.insert(1, 'timeframe', timeframe_minutes)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True).dt.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+    with storage.transaction() as conn:
+        conn.executemany(f'''INSERT OR REPLACE INTO {TABLES[kind][0]} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                         df.itertuples(index=False, name=None))
+
+def load_bars(symbols, start, end, timeframe_minutes, kind='option'):
+    placeholders = ','.join('?' * len(symbols))
+    df = pd.read_sql_query(f'''SELECT symbol, timestamp, {', '.join(BAR_COLUMNS)} FROM {TABLES[kind][0]}
+                               WHERE symbol IN ({placeholders}) AND timeframe = ?
+                               AND timestamp >= ? AND timestamp <= ?
+                               ORDER BY symbol, timestamp''',
+                           storage.get_connection(), params=list(symbols) + [timeframe_minutes, start, end])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+    return df
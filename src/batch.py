@@ -0,0 +1,137 @@
+"""Headless batch mode: run the straddle analysis over a ticker universe and fill the performance tables
+
+Usage:
+    python src/batch.py NVDA AAPL MSFT --lookback 5 --lookahead 2
+    python src/batch.py --tickers-file universe.txt --workers 8 --run-id nightly-2024-06-01
+"""
+import argparse
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import analytics
+import config
+import event_study
+import gateway
+import performance
+import storage
+
+logger = logging.getLogger('app_logger')
+
+def get_completed_tickers(run_id):
+    conn = storage.get_connection()
+    c = conn.execute('''SELECT ticker FROM batch_checkpoint WHERE run_id = ?''', (run_id,))
+    return {row[0] for row in c.fetchall()}
+
+def save_batch_results(run_id, results):
+    """Write performance rows and checkpoints for finished tickers in one transaction"""
+    now = datetime.now().isoformat()
+    with storage.transaction() as conn:
+        performance.save_performance_rows([row for r in results for row in r['pre_rows']],
+                                          [row for r in results for row in r['post_rows']])
+        conn.executemany('''INSERT OR REPLACE INTO batch_checkpoint VALUES (?, ?, ?, ?, ?)''',
+                         [(run_id, r['ticker'], r['events'], r['errors'], now) for r in results])
+
+
+def process_ticker(ticker, lookback, lookahead, history_days):
+    """Analyze every earnings event of one ticker, runs inside a worker process"""
+    pre_rows, post_rows = [], []
+
+    analyzed = performance.analyze_ticker(ticker, lookback, lookahead, history_days=history_days)
+    errors = sum(error is not None for _, _, _, error in analyzed)
+    events = [(earnings_date, result['df']['straddle'].to_numpy(), result['earnings_idx'])
+              for earnings_date, _, result, _ in analyzed if result is not None]
+
+    # Metrics for all of the ticker's events in one pass over the aligned event matrix
+    study = event_study.run_study(events)
+    if study is not None:
+        metrics = study['metrics'].dropna(subset=['pre_earnings_change', 'post_earnings_change'])
+        pre_rows = [(ticker, d, lookback, change) for d, change in metrics['pre_earnings_change'].items()]
+        post_rows = [(ticker, d, lookahead, change) for d, change in metrics['post_earnings_change'].items()]
+
+    return {'ticker': ticker, 'events': len(pre_rows), 'errors': errors,
+            'pre_rows': pre_rows, 'post_rows': post_rows}
+
+def _init_worker(rate_limits, workers):
+    """Give each worker process an even slice of the parent's upstream rate budget"""
+    config.UPSTREAM_RATE_LIMITS = rate_limits
+    gateway.limit_rates(1 / workers)
+
+def run_batch(tickers, lookback, lookahead, history_days=366, workers=None, run_id=None):
+    """Process tickers across a process pool, resuming from the checkpoint for run_id"""
+    workers = workers or config.BATCH_WORKERS
+    run_id = run_id or f"{datetime.today().date()}-{lookback}-{lookahead}"
+
+    completed = get_completed_tickers(run_id)
+    pending = [t for t in dict.fromkeys(tickers) if t not in completed]
+    logger.info(f"Run {run_id}: {len(pending)} tickers pending, {len(completed)} already done")
+
+    start = time.perf_counter()
+    finished, failed, events = 0, 0, 0
+    buffer = []
+
+    # Token buckets are per process, so the workers split the budget instead of each using all of it
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(config.UPSTREAM_RATE_LIMITS, workers)) as pool:
+        futures = {pool.submit(process_ticker, t, lookback, lookahead, history_days): t for t in pending}
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # Not checkpointed, so the ticker is retried when the run is resumed
+                failed += 1
+                logger.error(f"Ticker {ticker} failed: {str(e)}")
+                continue
+
+            buffer.append(result)
+            finished += 1
+            events += result['events']
+            if len(buffer) >= config.BATCH_FLUSH_SIZE:
+                save_batch_results(run_id, buffer)
+                buffer = []
+
+    if buffer:
+        save_batch_results(run_id, buffer)
+    analytics.refresh_summaries(market_max_age=0)
+
+    elapsed_min = max(time.perf_counter() - start, 1e-9) / 60
+    stats = {
+        'run_id': run_id,
+        'tickers': finished,
+        'failed': failed,
+        'events': events,
+        'elapsed_sec': round(elapsed_min * 60, 2),
+        'tickers_per_min': round(finished / elapsed_min, 2),
+        'events_per_min': round(events / elapsed_min, 2),
+    }
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the earnings straddle analysis for many tickers")
+    parser.add_argument('tickers', nargs='*', help="Ticker symbols")
+    parser.add_argument('--tickers-file', help="File with one ticker per line")
+    parser.add_argument('--lookback', type=int, default=5, help="Days before earnings")
+    parser.add_argument('--lookahead', type=int, default=2, help="Days after earnings")
+    parser.add_argument('--history-days', type=int, default=366, help="Only analyze earnings within this many days")
+    parser.add_argument('--workers', type=int, default=config.BATCH_WORKERS, help="Worker processes")
+    parser.add_argument('--run-id', help="Checkpoint key, reuse it to resume an interrupted run")
+    args = parser.parse_args()
+
+    tickers = [t.upper() for t in args.tickers]
+    if args.tickers_file:
+        with open(args.tickers_file) as f:
+            tickers += [line.strip().upper() for line in f if line.strip() and not line.startswith('#')]
+    if not tickers:
+        parser.error("No tickers given")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    stats = run_batch(tickers, args.lookback, args.lookahead, args.history_days, args.workers, args.run_id)
+
+    print(f"Run {stats['run_id']}: {stats['tickers']} tickers ({stats['failed']} failed), "
+          f"{stats['events']} events in {stats['elapsed_sec']}s")
+    print(f"Throughput: {stats['tickers_per_min']} tickers/min, {stats['events_per_min']} events/min")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Pool of warm headless Chrome drivers shared by the earnings scraper"""
+from contextlib import contextmanager
+import threading
+import logging
+import queue
+import config
+import providers
+
+def create_driver():
+    from selenium import webdriver
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+
+    driver = webdriver.Chrome(options=options)
+    driver.set_page_load_timeout(30)
+    return driver
+
+class BrowserPool:
+    """Hands out warm drivers, recycling them after max_pages page loads or a crash"""
+
+    def __init__(self, size=config.BROWSER_POOL_SIZE, max_pages=config.BROWSER_MAX_PAGES, factory=create_driver):
+        self.max_pages = max_pages
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @contextmanager
+    def driver(self):
+        """Borrow a driver for the duration of the with-block"""
+        from selenium.common.exceptions import WebDriverException
+        self._slots.acquire()
+        try:
+            try:
+                driver, pages = self._idle.get_nowait()
+            except queue.Empty:
+                driver, pages = self.factory(), 0
+
+            try:
+                yield driver
+            except WebDriverException:
+                # A crashed or hung browser is never handed out again
+                logging.warning("Discarding browser after WebDriver error")
+                self._quit(driver)
+                raise
+            except BaseException:
+                self._release(driver, pages + 1)
+                raise
+            else:
+                self._release(driver, pages + 1)
+        finally:
+            self._slots.release()
+
+    def _release(self, driver, pages):
+        with self._lock:
+            if self._closed or pages >= self.max_pages:
+                self._quit(driver)
+            else:
+                self._idle.put((driver, pages))
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    driver, _ = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                self._quit(driver)
+
+
+def get_pool():
+    """Process-wide pool, created on first use and shut down at exit"""
+    return providers.get('browser_pool')
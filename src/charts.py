@@ -0,0 +1,179 @@
+"""Plotly figures for the dashboard"""
+import numpy as np
+import config
+from downsample import lttb_indices
+
+def build_straddle_figure(df, earnings_idx, title, max_points=config.CHART_MAX_POINTS):
+    """Call, put and straddle lines with the earnings bar marked
+
+    Long series are downsampled with LTTB for display only and drawn with WebGL;
+    x positions stay raw bar indices so the earnings marker lines up.
+    """
+    import plotly.graph_objects as go
+
+    keep = lttb_indices(np.arange(len(df)), df['straddle'].to_numpy(), max_points)
+    labels = df['timestamp_label'].to_numpy()
+    trace = go.Scattergl if len(keep) > config.WEBGL_THRESHOLD else go.Scatter
+
+    fig = go.Figure()
+    for column, name, line in [
+        ('call_close', 'Call', dict(color='rgba(0, 255, 0, 0.3)', width=1.5)),  # faint green
+        ('put_close', 'Put', dict(color='rgba(255, 0, 0, 0.3)', width=1.5)),  # faint red
+        ('straddle', 'Straddle', dict(color='#1f77b4', width=2)),  # solid blue
+    ]:
+        fig.add_trace(trace(
+            x=keep,
+            y=df[column].to_numpy()[keep],
+            mode='lines',
+            name=name,
+            line=line,
+            text=labels[keep],
+            hovertemplate='%{text}<br>' + name + ': $%{y:.2f}<extra></extra>'
+        ))
+
+    return _finish_figure(fig, labels, earnings_idx, title)
+
+def build_ladder_figure(df, structures, earnings_idx, title, max_points=config.CHART_MAX_POINTS):
+    """One line per ladder structure with the earnings bar marked, downsampled like the straddle chart"""
+    import plotly.graph_objects as go
+
+    # Every structure shares the bars picked for the first one (the straddle) so x stays aligned
+    keep = lttb_indices(np.arange(len(df)), df[structures[0]].to_numpy(), max_points)
+    labels = df['timestamp_label'].to_numpy()
+    trace = go.Scattergl if len(keep) > config.WEBGL_THRESHOLD else go.Scatter
+
+    fig = go.Figure()
+    for i, name in enumerate(structures):
+        fig.add_trace(trace(
+            x=keep,
+            y=df[name].to_numpy()[keep],
+            mode='lines',
+            name=name,
+            line=dict(width=2.5 if i == 0 else 1.5),
+            text=labels[keep],
+            hovertemplate='%{text}<br>' + name + ': $%{y:.2f}<extra></extra>'
+        ))
+    return _finish_figure(fig, labels, earnings_idx, title)
+
+def build_volatility_figure(df, earnings_idx, title, max_points=config.CHART_MAX_POINTS):
+    """Call and put implied volatility with the straddle-implied and realized moves, in percent"""
+    import plotly.graph_objects as go
+
+    keep = lttb_indices(np.arange(len(df)), df['straddle'].to_numpy(), max_points)
+    labels = df['timestamp_label'].to_numpy()
+    trace = go.Scattergl if len(keep) > config.WEBGL_THRESHOLD else go.Scatter
+
+    fig = go.Figure()
+    for column, name, line, axis in [
+        ('call_iv', 'Call IV', dict(color='rgba(0, 160, 0, 0.6)', width=1.5), 'y'),
+        ('put_iv', 'Put IV', dict(color='rgba(200, 0, 0, 0.6)', width=1.5), 'y'),
+        ('implied_move', 'Implied Move', dict(color='#1f77b4', width=2), 'y2'),
+        ('realized_move', 'Realized Move', dict(color='#ff7f0e', width=2), 'y2'),
+    ]:
+        fig.add_trace(trace(
+            x=keep,
+            y=df[column].to_numpy()[keep],
+            mode='lines',
+            name=name,
+            line=line,
+            yaxis=axis,
+            text=labels[keep],
+            hovertemplate='%{text}<br>' + name + ': %{y:.2f}%<extra></extra>'
+        ))
+
+    fig = _finish_figure(fig, labels, earnings_idx, title)
+    fig.update_layout(
+        yaxis_title="Implied Volatility (%)",
+        yaxis2=dict(title="Move (%)", overlaying='y', side='right', rangemode='tozero'),
+        legend=dict(x=1.08),
+    )
+    return fig
+
+def _finish_figure(fig, labels, earnings_idx, title):
+    """Earnings marker and timestamp tick labels shared by the bar-index charts"""
+    # Add earnings date vertical line
+    fig.add_shape(
+        type="line",
+        x0=earnings_idx, x1=earnings_idx,
+        y0=0, y1=1,
+        yref="paper",
+        line=dict(color="red", width=2, dash="dash")
+    )
+    fig.add_annotation(
+        x=earnings_idx,
+        y=1,
+        yref="paper",
+        text="Earnings",
+        showarrow=False,
+        yshift=10
+    )
+
+    # Configure x-axis with timestamp labels
+    tick_indices = np.arange(0, len(labels), max(1, len(labels) // 10))
+
+    fig.update_layout(
+        title=title,
+        xaxis_title="Date/Time (EST)",
+        yaxis_title="Price ($)",
+        hovermode='closest',
+        height=500,
+        template="plotly_white",
+        xaxis=dict(
+            tickmode='array',
+            tickvals=tick_indices.tolist(),
+            ticktext=labels[tick_indices].tolist()
+        )
+    )
+    return fig
+
+def build_event_study_figure(study, bar_minutes, title, max_points=config.CHART_MAX_POINTS,
+                             events_max_points=config.EVENT_STUDY_MAX_POINTS):
+    """Every event normalized to 100 at the bar before earnings, with the mean and quantile bands
+
+    The curve keeps at most max_points offsets (LTTB on the mean). The events share one set of
+    offsets, picked by LTTB on their column average, so the all-events trace stays within
+    events_max_points however many events there are; the earnings bar is always kept.
+    """
+    import plotly.graph_objects as go
+
+    offsets = study['offsets']
+    normalized = study['normalized']
+    curve = study['curve']
+    curve = curve.iloc[lttb_indices(curve.index.to_numpy(), curve['mean'].to_numpy(), max_points)]
+
+    counts = (~np.isnan(normalized)).sum(axis=0)
+    average = np.where(counts > 0, np.nansum(normalized, axis=0) / np.maximum(counts, 1), 100)
+    per_event = min(max_points, max(3, events_max_points // max(len(normalized), 1)))
+    columns = np.union1d(lttb_indices(offsets, average, per_event), np.searchsorted(offsets, 0))
+    columns = columns[columns < len(offsets)]
+
+    fig = go.Figure()
+    # Individual events as one faint trace, separated by NaN gaps
+    x = np.tile(np.r_[offsets[columns], np.nan], len(normalized))
+    y = np.hstack([normalized[:, columns], np.full((len(normalized), 1), np.nan)]).ravel()
+    trace = go.Scattergl if len(x) > config.WEBGL_THRESHOLD else go.Scatter
+    fig.add_trace(trace(x=x, y=y, mode='lines', name='Events', hoverinfo='skip',
+                        line=dict(color='rgba(128, 128, 128, 0.25)', width=1)))
+
+    for low, high, fill in [('p10', 'p90', 'rgba(31, 119, 180, 0.12)'), ('p25', 'p75', 'rgba(31, 119, 180, 0.25)')]:
+        fig.add_trace(go.Scatter(x=curve.index, y=curve[high], mode='lines', line=dict(width=0),
+                                 showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=curve.index, y=curve[low], mode='lines', line=dict(width=0),
+                                 fill='tonexty', fillcolor=fill, name=f'{low}-{high}', hoverinfo='skip'))
+    fig.add_trace(go.Scatter(x=curve.index, y=curve['p50'], mode='lines', name='Median',
+                             line=dict(color='#1f77b4', width=2, dash='dot')))
+    fig.add_trace(go.Scatter(x=curve.index, y=curve['mean'], mode='lines', name='Mean',
+                             line=dict(color='#1f77b4', width=2.5),
+                             customdata=curve['events'],
+                             hovertemplate='Bar %{x}<br>Mean: %{y:.1f}<br>%{customdata} events<extra></extra>'))
+
+    fig.add_vline(x=0, line=dict(color='red', width=2, dash='dash'), annotation_text='Earnings')
+    fig.update_layout(
+        title=title,
+        xaxis_title=f"Bars from earnings ({bar_minutes} min)",
+        yaxis_title="Straddle (pre-earnings = 100)",
+        hovermode='closest',
+        height=500,
+        template="plotly_white",
+    )
+    return fig
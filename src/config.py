@@ -1,9 +1,87 @@
 """Configuration settings for the dashboard"""
+import os
 
 # API Configuration
 DEFAULT_API_URL = "https://jsonplaceholder.typicode.com/posts"
-API_TIMEOUT = 10
+API_TIMEOUT = 10  # read timeout (seconds)
+HTTP_CONNECT_TIMEOUT = 3.05
+HTTP_POOL_SIZE = 16  # keep-alive connections per host, at least CHAIN_FETCH_CONCURRENCY
+CHAIN_FETCH_CONCURRENCY = 8  # chain requests in flight during batch warm-up
+PRICE_945_SPAN_DAYS = 366  # a ticker's 9:45 dates within this span share one request (~6.5k 15-min bars, one page)
+MARKETDATA_BASE_URL = os.environ.get('MARKETDATA_BASE_URL', "https://api.marketdata.app")
+YAHOO_BASE_URL = os.environ.get('YAHOO_BASE_URL', "https://finance.yahoo.com")
 CACHE_TTL = 300  # seconds
+RESULT_CACHE_MAX_MB = 256  # memory budget for computed per-event results
+
+# Upstream gateway (limits apply per process)
+UPSTREAM_RATE_LIMITS = {  # provider -> (requests per second, burst)
+    'alpaca': (3.0, 10),  # free plan allows 200 requests/min
+    'marketdata': (2.0, 5),
+    'yahoo': (1.0, 3),
+}
+UPSTREAM_RETRIES = 3  # retries after the first attempt for network, 429 and 5xx failures
+UPSTREAM_BACKOFF_SEC = 0.5  # first retry delay, doubled on each further attempt
+UPSTREAM_BACKOFF_MAX_SEC = 8
+
+# Earnings scraper
+SCRAPER_USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+BROWSER_POOL_SIZE = 2  # warm headless Chrome drivers kept per process
+BROWSER_MAX_PAGES = 50  # page loads before a driver is recycled
+EARNINGS_DEFAULT_SPACING_DAYS = 91  # assumed gap between reports when history is too short
+EARNINGS_RETRY_DAYS = 3  # re-scrape interval while an overdue report hasn't shown up yet
+EARNINGS_FAILED_RETRY_MIN = 30  # wait after a failed scrape (browser fallback included) before trying the ticker again
+
+# Storage
+DB_PATH = os.environ.get('EARNINGS_DB_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'earnings.db'))
+DB_BUSY_TIMEOUT_MS = 10000  # wait this long for another writer before raising "database is locked"
+SUMMARY_MARKET_REFRESH_SEC = 300  # market-wide summaries rescan a whole window, so recompute them at most this often
+
+# Trading calendar
+CALENDAR_START = "2000-01-01"  # first session in the precomputed NYSE index
+CALENDAR_YEARS_AHEAD = 2
+
+# Charts
+BAR_RESOLUTIONS = {"1 min": 1, "5 min": 5, "15 min": 15, "30 min": 30, "1 hour": 60}
+CHART_MAX_POINTS = 1500  # points per trace after LTTB downsampling
+WEBGL_THRESHOLD = 1000  # traces longer than this render with Scattergl
+EVENT_STUDY_MAX_POINTS = 20000  # points in the event study's all-events trace, split evenly across events
+
+MAX_HISTORY_YEARS = 25  # longest history the dashboard can study (the calendar scrape grows to 4 rows per year)
+
+# Strike ladder
+LADDER_DEFAULT_WIDTH = 2  # strikes either side of ATM
+LADDER_MAX_WIDTH = 5
+
+# Implied volatility
+RISK_FREE_RATE = 0.04  # annualized, continuously compounded; used by the Black-Scholes IV solver
+
+# Telemetry
+TELEMETRY_BUFFER_SIZE = 5000  # spans kept in memory for the Performance tab
+LOG_BUFFER_SIZE = 2000  # log lines kept in memory for the Logs tab
+TELEMETRY_JSONL_PATH = os.environ.get('TELEMETRY_JSONL_PATH')  # optional: append spans as JSON lines
+TELEMETRY_SQLITE = os.environ.get('TELEMETRY_SQLITE') == '1'  # optional: store spans in telemetry_spans
+
+# Concurrency
+FETCH_WORKERS = 4  # max earnings events fetched in parallel (keeps us inside API quotas)
+BATCH_WORKERS = 4  # worker processes for batch mode
+BATCH_FLUSH_SIZE = 25  # tickers buffered before a bulk write + checkpoint
+
+# JSON API service
+API_HOST = os.environ.get('API_HOST', '127.0.0.1')  # local only by default; the service has no auth
+API_PORT = int(os.environ.get('API_PORT', 8502))
+API_WORKERS = 8  # threads running event pipelines for API requests
+API_MAX_BODY_BYTES = 1 << 20
+API_MAX_BATCH_TICKERS = 500
+
+# Prefetch scheduler
+STANDARD_SETTINGS = [(5, 2), (3, 1), (10, 3)]  # (lookback, lookahead) precomputed for watchlist tickers
+PREFETCH_LEAD_DAYS = 7  # warm a ticker this many days before its next report
+OFF_PEAK_HOURS = (20, 6)  # local-time window for background work; weekends count as off-peak too
+SCHEDULER_RATE_SHARE = 0.5  # fraction of each provider's rate limit the scheduler may use
+SCHEDULER_POLL_SEC = 300  # idle wait between queue checks
+SCHEDULER_PLAN_INTERVAL_SEC = 6 * 3600  # how often report dates are re-read to plan new jobs
+SCHEDULER_JOB_PAUSE_SEC = 5  # pause between jobs to spread the load
+SCHEDULER_MAX_ATTEMPTS = 3
 
 # Dashboard Settings
 PAGE_TITLE = "API Dashboard"
@@ -0,0 +1,103 @@
+"""Event study: every earnings event's straddle aligned on bar offsets from the earnings bar
+
+Events become rows of one (events x offsets) matrix, so metrics and the average curve
+across events are single vectorized passes however many years of reports there are.
+"""
+from datetime import datetime
+import pandas as pd
+import numpy as np
+
+QUANTILES = [10, 25, 50, 75, 90]
+
+def earnings_timestamp(earnings_date, earnings_time):
+    """Release time in US/Eastern: 9:30 for before-market reports, 16:00 for after-market"""
+    hour, minute = (9, 30) if earnings_time == 'before' else (16, 0)
+    return pd.Timestamp(datetime.combine(earnings_date, datetime.min.time()).replace(hour=hour, minute=minute)).tz_localize('US/Eastern')
+
+def nearest_index(sorted_ns, target_ns):
+    """Position of the value closest to target in a sorted int64 array (earlier one on ties)"""
+    i = int(np.searchsorted(sorted_ns, target_ns))
+    if i == len(sorted_ns) or (i > 0 and target_ns - sorted_ns[i - 1] <= sorted_ns[i] - target_ns):
+        return i - 1
+    return i
+
+def align_events(series, earnings_idx):
+    """Stack per-event series into an (events x offsets) matrix with offset 0 at each earnings bar
+
+    Returns (offsets, matrix); cells an event has no bar for are NaN.
+    """
+    lengths = np.array([len(s) for s in series])
+    earnings_idx = np.asarray(earnings_idx)
+    offsets = np.arange(-earnings_idx.max(), (lengths - earnings_idx).max())
+
+    # Flat position of every (event, offset) cell in the concatenated series
+    starts = np.r_[0, np.cumsum(lengths)[:-1]]
+    positions = earnings_idx[:, None] + offsets[None, :]
+    valid = (positions >= 0) & (positions < lengths[:, None])
+    matrix = np.full(positions.shape, np.nan)
+    matrix[valid] = np.concatenate(series).astype(float)[(starts[:, None] + positions)[valid]]
+    return offsets, matrix
+
+def metrics_from_matrix(offsets, matrix):
+    """Initial, pre-earnings (bar before earnings) and final values with their changes, per event row"""
+    present = ~np.isnan(matrix)
+    rows = np.arange(len(matrix))
+    initial = matrix[rows, present.argmax(axis=1)]
+    final = matrix[rows, matrix.shape[1] - 1 - present[:, ::-1].argmax(axis=1)]
+    pre = matrix[:, np.searchsorted(offsets, -1)] if offsets[0] <= -1 else np.full(len(matrix), np.nan)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.DataFrame({
+            'initial_straddle': initial,
+            'pre_earnings_straddle': pre,
+            'final_straddle': final,
+            'pre_earnings_change': (pre - initial) / initial * 100,
+            'post_earnings_change': (final - pre) / pre * 100,
+            'total_change': (final - initial) / initial * 100,
+        })
+
+def event_metrics(series, earnings_idx, labels=None):
+    """compute_metrics for many events at once; labels (e.g. earnings dates) become the index"""
+    offsets, matrix = align_events(series, earnings_idx)
+    metrics = metrics_from_matrix(offsets, matrix)
+    if labels is not None:
+        metrics.index = pd.Index(labels, name='earnings_date')
+    return metrics
+
+def normalize(offsets, matrix):
+    """Each event scaled so its pre-earnings value is 100"""
+    pre = matrix[:, np.searchsorted(offsets, -1)] if offsets[0] <= -1 else np.full(len(matrix), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return matrix / pre[:, None] * 100
+
+def average_curve(offsets, normalized):
+    """Mean, quantiles and event count of the normalized events at each offset"""
+    counts = (~np.isnan(normalized)).sum(axis=0)
+    keep = counts > 0
+    values = normalized[:, keep]
+    curve = pd.DataFrame(np.nanpercentile(values, QUANTILES, axis=0).T,
+                         columns=[f'p{q}' for q in QUANTILES], index=pd.Index(offsets[keep], name='offset'))
+    curve.insert(0, 'mean', np.nanmean(values, axis=0))
+    curve['events'] = counts[keep]
+    return curve
+
+def run_study(events):
+    """Align (label, straddle values, earnings bar index) events and summarize them
+
+    Returns {'labels', 'offsets', 'normalized', 'metrics', 'curve'}, or None without events.
+    """
+    events = [e for e in events if len(e[1])]
+    if not events:
+        return None
+    labels, series, earnings_idx = zip(*events)
+    offsets, matrix = align_events(series, earnings_idx)
+    normalized = normalize(offsets, matrix)
+    metrics = metrics_from_matrix(offsets, matrix)
+    metrics.index = pd.Index(labels, name='earnings_date')
+    return {
+        'labels': list(labels),
+        'offsets': offsets,
+        'normalized': normalized,
+        'metrics': metrics,
+        'curve': average_curve(offsets, normalized),
+    }
@@ -0,0 +1,173 @@
+"""Shared gateway in front of every upstream API (Alpaca, marketdata.app, Yahoo)
+
+Identical in-flight requests are collapsed into one call whose result every waiter
+receives, each provider is held to its own token-bucket rate, and failures are
+retried with exponential backoff before surfacing as UpstreamError.
+"""
+import threading
+import logging
+import random
+import time
+import config
+
+class UpstreamError(Exception):
+    """An upstream call failed (after retries, if the failure was retryable)"""
+
+    def __init__(self, provider, message, status_code=None):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.status_code = status_code
+
+class TokenBucket:
+    """Allows `rate` calls per second on average with bursts of up to `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until one is available; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers with the same key share its outcome"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """fn() for the first caller of key, its result (or exception) for everyone who joins meanwhile
+
+        Returns (result, shared) where shared is True for callers that joined another's call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+def _status_code(exc):
+    """HTTP status behind an exception from requests or alpaca-py, if any"""
+    try:
+        status = getattr(exc, 'status_code', None)
+        if status is None:
+            status = getattr(getattr(exc, 'response', None), 'status_code', None)
+        return int(status) if status is not None else None
+    except Exception:
+        return None
+
+def is_retryable(exc):
+    """Network errors, throttling (429) and server errors are worth retrying; other client errors aren't"""
+    status = _status_code(exc)
+    return status is None or status == 429 or status >= 500
+
+class Gateway:
+    """Coalescing, rate limiting and retries for one provider"""
+
+    def __init__(self, provider, rate, burst, retries=config.UPSTREAM_RETRIES,
+                 backoff=config.UPSTREAM_BACKOFF_SEC, max_backoff=config.UPSTREAM_BACKOFF_MAX_SEC):
+        self.provider = provider
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.bucket = TokenBucket(rate, burst)
+        self._flight = SingleFlight()
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'upstream_calls': 0, 'coalesced': 0, 'retries': 0,
+                       'failures': 0, 'throttled_sec': 0.0}
+
+    def call(self, key, fn):
+        """fn() shared by concurrent callers with the same (hashable) key, rate limited and retried"""
+        self._count('requests')
+        result, shared = self._flight.do(key, lambda: self._call_with_retries(fn))
+        if shared:
+            self._count('coalesced')
+        return result
+
+    def _call_with_retries(self, fn):
+        for attempt in range(self.retries + 1):
+            self._count('throttled_sec', self.bucket.acquire())
+            self._count('upstream_calls')
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == self.retries or not is_retryable(e):
+                    self._count('failures')
+                    if isinstance(e, UpstreamError):
+                        raise
+                    raise UpstreamError(self.provider, f"{type(e).__name__}: {e}", _status_code(e)) from e
+                # Full jitter keeps retrying sessions from stampeding in lockstep
+                delay = min(self.backoff * 2 ** attempt, self.max_backoff) * random.uniform(0.5, 1.0)
+                logging.warning(f"{self.provider} call failed ({type(e).__name__}: {e}), retrying in {delay:.2f}s")
+                self._count('retries')
+                time.sleep(delay)
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats, throttled_sec=round(self._stats['throttled_sec'], 3))
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+def get(provider):
+    """Process-wide gateway for a provider, shared by every session"""
+    with _gateways_lock:
+        if provider not in _gateways:
+            rate, burst = config.UPSTREAM_RATE_LIMITS[provider]
+            _gateways[provider] = Gateway(provider, rate, burst)
+        return _gateways[provider]
+
+def limit_rates(share):
+    """Scale every provider's rate budget to a share of the configured one, for processes that split it"""
+    config.UPSTREAM_RATE_LIMITS = {provider: (rate * share, max(1, int(burst * share)))
+                                   for provider, (rate, burst) in config.UPSTREAM_RATE_LIMITS.items()}
+    # Gateways built before (e.g. inherited through fork) still hold the old buckets
+    with _gateways_lock:
+        _gateways.clear()
+
+def all_stats():
+    with _gateways_lock:
+        return {name: gw.stats() for name, gw in _gateways.items()}
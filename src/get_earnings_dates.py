@@ -1,110 +1,188 @@
 import pandas as pd
-from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-import sqlite3
-import os
-
-def get_earnings_for_symbol(symbol, limit):
-    # Create driver instance for each call
-    options = webdriver.ChromeOptions()
-    options.add_argument('--headless')
-    options.add_argument('--disable-gpu')
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    options.page_load_timeout = 30
+import storage
+import telemetry
+import browser_pool
+import gateway
+import http_client
+import config
+import logging
+
+def parse_earnings_table(html):
+    """Parse the Yahoo earnings table from page HTML, None if the table isn't there"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
     
-    driver = webdriver.Chrome(options=options)
+    table = soup.find('table', {'class': 'bd'})
+    if not table:
+        return None
     
+    headers = [header.text for header in table.find_all('th')]
+    rows = []
+    for row in table.find_all('tr')[1:]:
+        rows.append([cell.text for cell in row.find_all('td')])
+    
+    headers = [h.strip() for h in headers]
+    return pd.DataFrame(rows, columns=headers)
+
+def fetch_earnings_html(url):
+    """Plain HTTP fetch of the earnings page, None on failure"""
+    def fetch():
+        response = http_client.get(url, headers={'User-Agent': config.SCRAPER_USER_AGENT})
+        response.raise_for_status()
+        return response.text
     try:
-        today_date = datetime.now().date().strftime("%Y-%m-%d")
-        url = f"https://finance.yahoo.com/calendar/earnings?day={today_date}&symbol={symbol}&offset=0&size={limit}"
-        print(url)
-        
-        driver.set_page_load_timeout(30)
-        driver.get(url)
-        driver.implicitly_wait(5)
-        
-        page_content = driver.page_source
-        soup = BeautifulSoup(page_content, 'html.parser')
-        
-        table = soup.find('table', {'class': 'bd'})
-        
-        if table:
-            headers = [header.text for header in table.find_all('th')]
-            rows = []
-            for row in table.find_all('tr')[1:]:
-                rows.append([cell.text for cell in row.find_all('td')])
-            
-            headers = [h.strip() for h in headers]
-            df = pd.DataFrame(rows, columns=headers)
-            return df
-        else:
-            print("Earnings table not found")
-            return None
-    finally:
-        driver.quit()
+        return gateway.get('yahoo').call(('html', url), fetch)
+    except gateway.UpstreamError as e:
+        logging.warning(f"HTTP fetch failed, falling back to the browser: {str(e)}")
+        return None
 
-def get_past_earnings_dates(symbol, limit=20, years=5):
-    init_db()
+def render_earnings_html(url):
+    """Earnings page source after rendering in a pooled headless browser"""
+    def render():
+        with browser_pool.get_pool().driver() as driver:
+            driver.get(url)
+            driver.implicitly_wait(5)
+            return driver.page_source
+    return gateway.get('yahoo').call(('rendered', url), render)
+
+def get_earnings_for_symbol(symbol, limit, parser=parse_earnings_table):
+    today_date = datetime.now().date().strftime("%Y-%m-%d")
+    url = f"{config.YAHOO_BASE_URL}/calendar/earnings?day={today_date}&symbol={symbol}&offset=0&size={limit}"
+    print(url)
+    
+    # Fast path: skip the browser when the table is in the initial HTML
+    html = fetch_earnings_html(url)
+    df = parser(html) if html else None
+    if df is not None:
+        return df
+    
+    # Fall back to a pooled headless browser for the rendered page
+    df = parser(render_earnings_html(url))
     
-    # Check cache first
-    cached = get_cached_earnings(symbol)
-    if cached:
-        return cached
+    if df is None:
+        print("Earnings table not found")
+    return df
+
+def get_past_earnings_dates(symbol, limit=20, years=5):
+    with telemetry.span('earnings_scrape', ticker=symbol) as span:
+        # Past events are cached permanently; only scrape once the next report should be out
+        cached = get_cached_earnings(symbol) or []
+        fresh = bool(cached) and not needs_refresh(symbol, cached) and get_history_rows(symbol) >= limit
+        span.hit(fresh or scrape_failed_recently(symbol))
+        if span.cache_hit:
+            return cached[:years * 4]
     
-    # Fetch from web
-    df = get_earnings_for_symbol(symbol, limit)
+        # Fetch from web
+        df = get_earnings_for_symbol(symbol, limit)
+        if df is None:
+            # Counts as a scrape, so overdue reports wait EARNINGS_RETRY_DAYS and other misses back off
+            save_failed_scrape(symbol)
+            return cached[:years * 4]
     
-    # Extract date and determine if before/after market
-    df['date'] = pd.to_datetime(df['Earnings Date'].str.split(' at ').str[0])
-    df['timing'] = df['Earnings Date'].str.contains('PM', na=False).map({True: 'after', False: 'before'})
+        # Extract date and determine if before/after market
+        df['date'] = pd.to_datetime(df['Earnings Date'].str.split(' at ').str[0])
+        df['timing'] = df['Earnings Date'].str.contains('PM', na=False).map({True: 'after', False: 'before'})
     
-    # Filter past dates and get top results
-    past_df = df[df['date'] < pd.Timestamp.now()].nlargest(years * 4, 'date')
+        # Filter past dates and get top results
+        now = pd.Timestamp.now()
+        past_df = df[df['date'] < now].nlargest(years * 4, 'date')
+        scraped = [(row['date'].date(), row['timing']) for _, row in past_df.iterrows()]
     
-    # Return list of tuples (date, timing)
-    results = [(row['date'].date(), row['timing']) for _, row in past_df.iterrows()]
+        # Merge in only the rows we don't have yet
+        known = {d for d, _ in cached}
+        new_rows = [(d, t) for d, t in scraped if d not in known]
+        if new_rows:
+            save_earnings(symbol, new_rows)
     
-    # Save to cache
-    if results:
-        save_earnings(symbol, results)
+        # Remember the announced next report date, if Yahoo lists one
+        upcoming = df[df['date'] >= now].nsmallest(1, 'date')
+        next_date, next_time = (upcoming['date'].iloc[0].date(), upcoming['timing'].iloc[0]) if not upcoming.empty else (None, None)
+        save_refresh_state(symbol, next_date, next_time, limit)
     
-    return results
+        results = sorted(cached + new_rows, reverse=True)
+        return results[:years * 4]
 
+def expected_next_report(dates):
+    """Next report date estimated from the usual spacing between past reports"""
+    recent = sorted(dates)[-9:]
+    gaps = sorted((b - a).days for a, b in zip(recent, recent[1:]))
+    spacing = gaps[len(gaps) // 2] if gaps else config.EARNINGS_DEFAULT_SPACING_DAYS
+    spacing = min(max(spacing, 60), 120)  # ignore odd gaps from restatements or missing rows
+    return recent[-1] + timedelta(days=spacing)
+
+def needs_refresh(ticker, cached):
+    """Whether the ticker's next report should have happened since we last looked"""
+    last_scraped, next_date, _ = get_refresh_state(ticker)
+    next_expected = next_date or expected_next_report([d for d, _ in cached])
+    
+    today = datetime.now().date()
+    if today <= next_expected:
+        return False
+    
+    # Report is due but wasn't listed when we last checked: retry every few days
+    if last_scraped and last_scraped.date() > next_expected:
+        return (today - last_scraped.date()).days >= config.EARNINGS_RETRY_DAYS
+    return True
 
-def init_db():
-    conn = sqlite3.connect('earnings.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS earnings
-                 (ticker TEXT, earnings_date DATE, earnings_time TEXT, fetched_at TIMESTAMP, 
-                  PRIMARY KEY (ticker, earnings_date))''')
-    conn.commit()
-    conn.close()
 
 def get_cached_earnings(ticker):
-    conn = sqlite3.connect('earnings.db')
-    c = conn.cursor()
-    three_months_ago = (datetime.now() - timedelta(days=90)).isoformat()
-    c.execute('''SELECT earnings_date, earnings_time FROM earnings 
-                 WHERE ticker = ? AND fetched_at > ?
-                 ORDER BY earnings_date DESC''', 
-              (ticker, three_months_ago))
+    conn = storage.get_connection()
+    c = conn.execute('''SELECT earnings_date, earnings_time FROM earnings 
+                        WHERE ticker = ?
+                        ORDER BY earnings_date DESC''', 
+                     (ticker,))
     results = [(datetime.strptime(row[0], '%Y-%m-%d').date(), row[1]) for row in c.fetchall()]
-    conn.close()
     return results if results else None
 
 def save_earnings(ticker, dates_with_times):
-    conn = sqlite3.connect('earnings.db')
-    c = conn.cursor()
     now = datetime.now().isoformat()
-    for date, time in dates_with_times:
-        c.execute('''INSERT OR REPLACE INTO earnings VALUES (?, ?, ?, ?)''',
-                  (ticker, str(date), time, now))
-    conn.commit()
-    conn.close()
+    with storage.transaction() as conn:
+        conn.executemany('''INSERT OR IGNORE INTO earnings VALUES (?, ?, ?, ?)''',
+                         [(ticker, str(date), time, now) for date, time in dates_with_times])
+
+def get_refresh_state(ticker):
+    """(last_scraped_at, next_date, next_time) for the ticker, Nones if never scraped"""
+    conn = storage.get_connection()
+    row = conn.execute('''SELECT last_scraped_at, next_date, next_time FROM earnings_refresh WHERE ticker = ?''',
+                       (ticker,)).fetchone()
+    if row is None:
+        return None, None, None
+    last_scraped = datetime.fromisoformat(row[0])
+    next_date = datetime.strptime(row[1], '%Y-%m-%d').date() if row[1] else None
+    return last_scraped, next_date, row[2]
 
+def get_history_rows(ticker):
+    """Largest number of calendar rows scraped for the ticker so far, 0 if never scraped"""
+    conn = storage.get_connection()
+    row = conn.execute('''SELECT history_rows FROM earnings_refresh WHERE ticker = ?''', (ticker,)).fetchone()
+    return (row[0] or 0) if row else 0
 
+def save_refresh_state(ticker, next_date, next_time, history_rows):
+    with storage.transaction() as conn:
+        conn.execute('''INSERT INTO earnings_refresh (ticker, last_scraped_at, next_date, next_time, history_rows)
+                        VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT (ticker) DO UPDATE SET
+                            last_scraped_at = excluded.last_scraped_at, next_date = excluded.next_date,
+                            next_time = excluded.next_time,
+                            history_rows = MAX(history_rows, excluded.history_rows), last_failed_at = NULL''',
+                     (ticker, datetime.now().isoformat(), str(next_date) if next_date else None, next_time, history_rows))
+
+def save_failed_scrape(ticker):
+    """Record a failed scrape as the last attempt, keeping the known next report and history depth"""
+    now = datetime.now().isoformat()
+    with storage.transaction() as conn:
+        conn.execute('''INSERT INTO earnings_refresh (ticker, last_scraped_at, history_rows, last_failed_at)
+                        VALUES (?, ?, 0, ?)
+                        ON CONFLICT (ticker) DO UPDATE SET
+                            last_scraped_at = excluded.last_scraped_at, last_failed_at = excluded.last_failed_at''',
+                     (ticker, now, now))
 
+def scrape_failed_recently(ticker):
+    """Whether the last scrape for the ticker failed less than EARNINGS_FAILED_RETRY_MIN ago"""
+    conn = storage.get_connection()
+    row = conn.execute('''SELECT last_failed_at FROM earnings_refresh WHERE ticker = ?''', (ticker,)).fetchone()
+    if row is None or row[0] is None:
+        return False
+    return datetime.now() - datetime.fromisoformat(row[0]) < timedelta(minutes=config.EARNINGS_FAILED_RETRY_MIN)
@@ -1,97 +1,160 @@
-from alpaca.data.timeframe import TimeFrameUnit
-from alpaca.data.timeframe import TimeFrame
-from alpaca.data.historical.option import OptionBarsRequest
-from alpaca.data.historical.option import OptionHistoricalDataClient
 import pandas as pd
 import numpy as np
-from dotenv import dotenv_values
 from datetime import timedelta
 import logging
 import utils
-import pandas_market_calendars as mcal
-import streamlit as st
+import bar_store
+import telemetry
+import trading_calendar
 
-# Load API keys from Streamlit secrets
-alpaca_key = st.secrets["key"]
-alpaca_sec = st.secrets["sec"]
-option_client = OptionHistoricalDataClient(alpaca_key, alpaca_sec)
+NS_PER_DAY = 86400 * 10**9
 
-def get_options_data(ticker, earnings_date, lookback, lookahead):
-    
-    timeframe = TimeFrame(15, TimeFrameUnit('Min'))
-    
-    # Use market calendar for trading days
-    nyse = mcal.get_calendar('NYSE')
-    schedule = nyse.schedule(start_date=earnings_date - timedelta(days=lookback*2), end_date=earnings_date + timedelta(days=lookahead*2))
-    trading_days = schedule.index.date
-    
-    earnings_idx = list(trading_days).index(earnings_date) if earnings_date in trading_days else 0
-    start_date = trading_days[max(0, earnings_idx - lookback)]
-    end_date = trading_days[min(len(trading_days) - 1, earnings_idx + lookahead)]
+def get_trading_window(earnings_date, lookback, lookahead):
+    """First and last trading day of the window around an earnings date"""
+    calendar = trading_calendar.get_calendar()
+    start_idx, end_idx = calendar.window(earnings_date, lookback, lookahead)
+    return calendar.session(start_idx), calendar.session(end_idx)
+
+def prefetch_stock_prices(ticker, earnings_dates, lookback, lookahead):
+    """Warm the 9:45 price cache for every event of a ticker, one request per year-long span of events"""
+    start_dates = [get_trading_window(d, lookback, lookahead)[0] for d in earnings_dates]
+    return utils.get_stock_prices_at_945([(ticker, d) for d in start_dates])
+
+def prefetch_chains(ticker, earnings_dates, lookback, lookahead):
+    """Warm the chain cache for every event of a ticker with concurrent requests"""
+    chain_requests = [chain_request(ticker, d, get_trading_window(d, lookback, lookahead)[0]) for d in earnings_dates]
+    return utils.fetch_chains(chain_requests)
+
+def get_session_window(earnings_date, lookback, lookahead):
+    """(start_date, market open on start_date, market close on the last day) of the window"""
+    # Earnings on a non-trading day snap to the next session
+    calendar = trading_calendar.get_calendar()
+    start_idx, end_idx = calendar.window(earnings_date, lookback, lookahead)
     
-    start_time = f"{start_date.strftime('%Y-%m-%d')}T09:30:00-05:00"
-    end_time = f"{end_date.strftime('%Y-%m-%d')}T16:00:00-05:00"
+    # Actual session open/close, so DST and early closes are handled
+    return calendar.session(start_idx), calendar.market_open[start_idx], calendar.market_close[end_idx]
+
+def get_options_data(ticker, earnings_date, lookback, lookahead, bar_minutes=15):
+    """Call, put and straddle closes with the underlying's close on every bar, plus the [call, put] symbols"""
+    start_date, start_time, end_time = get_session_window(earnings_date, lookback, lookahead)
     
     symbols = find_symbol(ticker, earnings_date, start_date)
     if not symbols:
         logging.error(f"No valid options contracts found for {ticker} around {earnings_date}")
         return None, None
 
-    req = OptionBarsRequest(symbol_or_symbols=symbols, 
-                            start=start_time, 
-                            end=end_time, 
-                            limit=600, timeframe=timeframe)
+    # Served from the local bar store, only missing sub-ranges go to Alpaca
+    bars = bar_store.get_option_bars(symbols, start_time, end_time, timeframe_minutes=bar_minutes)
+    stock_bars = bar_store.get_stock_bars([ticker], start_time, end_time, timeframe_minutes=bar_minutes)
+    
+    with telemetry.span('dataframe_build', bars=len(bars)):
+        df = build_straddle_frame(bars, symbols[0], symbols[1])
+        df['underlying'] = align_closes(stock_bars, df['timestamp'])
+    return df, symbols
+
+def get_ladder_data(ticker, earnings_date, lookback, lookahead, width, bar_minutes=15):
+    """Closes of every ladder leg as a (timestamp x leg) matrix, fetched in one multi-symbol request
 
-    bars = option_client.get_option_bars(req)
-    data = bars.model_dump()['data']
+    Returns (timestamps, matrix, ladder) with matrix columns ordered ladder['calls'] + ladder['puts'],
+    or (None, None, None) when no contracts are found.
+    """
+    start_date, start_time, end_time = get_session_window(earnings_date, lookback, lookahead)
+    
+    ladder = find_ladder(ticker, earnings_date, start_date, width)
+    if not ladder:
+        logging.error(f"No valid options contracts found for {ticker} around {earnings_date}")
+        return None, None, None
     
-    call_df = pd.DataFrame([{'timestamp': bar['timestamp'], 'call_close': bar['close']} for bar in data[symbols[0]]])
-    put_df = pd.DataFrame([{'timestamp': bar['timestamp'], 'put_close': bar['close']} for bar in data[symbols[1]]])
+    legs = ladder['calls'] + ladder['puts']
+    bars = bar_store.get_option_bars(legs, start_time, end_time, timeframe_minutes=bar_minutes)
     
-    df = pd.merge(call_df, put_df, on='timestamp', how='outer').sort_values('timestamp')
-    df['date'] = pd.to_datetime(df['timestamp']).dt.date
+    with telemetry.span('dataframe_build', bars=len(bars)):
+        timestamps, matrix = build_leg_matrix(bars, legs)
+    return timestamps, matrix, ladder
+
+def build_leg_matrix(bars, leg_symbols):
+    """Closes of each leg on a shared sorted timestamp index, as a (timestamp x leg) matrix"""
+    # int64 nanoseconds, so the sort and search below never touch per-bar Timestamp objects
+    timestamps = pd.DatetimeIndex(bars['timestamp']).as_unit('ns').asi8
+    close = bars['close'].to_numpy(dtype=float)
     
-    for col in ['call_close', 'put_close']:
-        df[col] = df.groupby('date')[col].ffill().bfill()
+    # Scatter every bar into its (row, column) cell: rows by binary search, columns by symbol lookup
+    index = np.unique(timestamps)
+    columns = pd.Index(leg_symbols).get_indexer(bars['symbol'])
+    known = columns >= 0
+    matrix = np.full((len(index), len(leg_symbols)), np.nan)
+    matrix[np.searchsorted(index, timestamps[known]), columns[known]] = close[known]
     
+    # Forward fill gaps within each (UTC) day, then back fill the leading gap
+    days = index // NS_PER_DAY
+    for j in range(matrix.shape[1]):
+        matrix[:, j] = _bfill(_ffill_within(matrix[:, j], days))
+    return pd.DatetimeIndex(index, tz='UTC'), matrix
+
+def build_straddle_frame(bars, call_symbol, put_symbol):
+    """Align call and put closes on a shared timestamp index and add the straddle column"""
+    index, matrix = build_leg_matrix(bars, [call_symbol, put_symbol])
+    df = pd.DataFrame({'timestamp': index, 'call_close': matrix[:, 0], 'put_close': matrix[:, 1]})
     df['straddle'] = (df['call_close'] + df['put_close']).round(2)
     df[['call_close', 'put_close']] = df[['call_close', 'put_close']].round(2)
-    df = df.drop(columns=['date'])
-    return df, symbols
+    return df
+
+def align_closes(bars, timestamps):
+    """Close of the latest bar at or before each timestamp (NaN before the first bar), for one symbol's bars"""
+    bars = bars.sort_values('timestamp')
+    stamps = pd.DatetimeIndex(bars['timestamp']).as_unit('ns').asi8
+    close = bars['close'].to_numpy(dtype=float)
+    if not len(stamps):
+        # No underlying bars: only the IV columns depend on them, so the straddle still renders
+        return np.full(len(timestamps), np.nan)
+    i = np.searchsorted(stamps, pd.DatetimeIndex(timestamps).as_unit('ns').asi8, side='right') - 1
+    return np.where(i >= 0, close[np.maximum(i, 0)], np.nan)
+
+def _ffill_within(values, groups):
+    positions = np.arange(len(values))
+    last_valid = np.maximum.accumulate(np.where(np.isnan(values), -1, positions))
+    group_start = np.maximum.accumulate(np.where(np.r_[True, groups[1:] != groups[:-1]], positions, 0))
+    filled = values[np.maximum(last_valid, 0)]
+    return np.where(last_valid >= group_start, filled, np.nan)
+
+def _bfill(values):
+    positions = np.arange(len(values))
+    next_valid = np.minimum.accumulate(np.where(np.isnan(values), len(values), positions)[::-1])[::-1]
+    return np.where(next_valid < len(values), values[np.minimum(next_valid, len(values) - 1)], np.nan)
 
 def find_symbol(ticker, earnings_date, start_date):
     """Find the call and put symbols for the closest strike to stock price at 9:45 AM"""
+    stock_price, chain = find_chain(ticker, earnings_date, start_date)
+    if chain is None:
+        return None
+    
+    # Binary search for the strike closest to the stock price that lists both a call and a put
+    return chain.atm_pair(stock_price)
+
+def find_ladder(ticker, earnings_date, start_date, width):
+    """Call and put symbols for `width` strikes either side of the strike closest to the 9:45 price"""
+    stock_price, chain = find_chain(ticker, earnings_date, start_date)
+    if chain is None:
+        return None
+    return chain.strike_ladder(stock_price, width)
+
+def find_chain(ticker, earnings_date, start_date):
+    """(9:45 AM price on start_date, chain of expiries 1-2 weeks after earnings), chain None if unavailable"""
     # Get stock price at 9:45 AM on start_date
     stock_price = utils.get_stock_price_at_945(ticker, start_date)
     if not stock_price:
         logging.error(f"Could not find stock price for {ticker} on {start_date}")
-        return None
+        return None, None
     
-    # Get options chain with expiries between 1 day and 1 week after earnings
+    request = chain_request(ticker, earnings_date, start_date)
+    chain = utils.get_historical_options_chain(*request)
+    if chain is None or not len(chain):
+        logging.error(f"Could not find options chain for {ticker} from {request[2]} to {request[3]}")
+        return stock_price, None
+    return stock_price, chain
+
+def chain_request(ticker, earnings_date, start_date):
+    """(ticker, quote date, from, to) for the chain quoted on start_date with expiries 1-2 weeks after earnings"""
     from_date = (earnings_date + timedelta(days=8)).strftime('%Y-%m-%d')
     to_date = (earnings_date + timedelta(days=15)).strftime('%Y-%m-%d')
-    start_date_str = start_date.strftime('%Y-%m-%d')
-    
-    option_symbols = utils.get_historical_options_chain(ticker, start_date_str, from_date, to_date)
-    if not option_symbols:
-        logging.error(f"Could not find options chain for {ticker} from {from_date} to {to_date}")
-        return None
-    
-    # Extract unique strikes from call options
-    strikes = set()
-    for symbol in option_symbols:
-        if 'C' in symbol:
-            # Extract strike from symbol
-            strike_str = symbol[-8:]
-            strike = int(strike_str) / 1000
-            strikes.add(strike)
-    
-    # Find closest strike to stock price
-    closest_strike = min(strikes, key=lambda x: abs(x - stock_price))
-    
-    # Find the symbols with this strike
-    strike_str = f"{int(closest_strike * 1000):08d}"
-    call_symbol = [s for s in option_symbols if 'C' + strike_str in s][0]
-    put_symbol = [s for s in option_symbols if 'P' + strike_str in s][0]
-    
-    return [call_symbol, put_symbol]
\ No newline at end of file
+    return ticker, start_date.strftime('%Y-%m-%d'), from_date, to_date
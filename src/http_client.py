@@ -0,0 +1,31 @@
+"""Pooled keep-alive HTTP session shared by the marketdata.app and Yahoo fetchers
+
+One requests.Session per process keeps TLS connections open between calls, so repeated
+chain and calendar requests skip the handshake. The session is built through the
+provider registry on first use (override 'http_session' to inject a stand-in).
+requests already asks for gzip/deflate bodies by default. Responses are still read whole
+(no stream=True); chain and calendar payloads are small enough that this has not mattered.
+"""
+import config
+import providers
+import os
+
+def create_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    # pool_maxsize bounds the keep-alive connections per host; keep it >= the fetch concurrency
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=config.HTTP_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def get(url, headers=None, params=None):
+    """GET through the shared session with separate connect and read timeouts"""
+    return providers.get('http_session').get(url, headers=headers, params=params,
+                                             timeout=(config.HTTP_CONNECT_TIMEOUT, config.API_TIMEOUT))
+
+providers.register('http_session', create_session)
+# Batch workers are forked; pooled sockets must not be shared with the parent
+os.register_at_fork(after_in_child=lambda: providers.reset('http_session'))
@@ -0,0 +1,64 @@
+"""Multi-leg option structures priced from a (timestamp x leg) close matrix
+
+A structure is a weight vector over the ladder legs (calls then puts, each by ascending
+strike); pricing every structure at every bar is one matrix product.
+"""
+import pandas as pd
+import numpy as np
+
+def leg_weights(ladder, legs):
+    """Weight vector for {('C' or 'P', offset from ATM): quantity}, None if a strike is off the ladder"""
+    n = len(ladder['strikes'])
+    weights = np.zeros(2 * n)
+    for (right, offset), quantity in legs.items():
+        i = ladder['atm'] + offset
+        if not 0 <= i < n:
+            return None
+        weights[i if right == 'C' else n + i] += quantity
+    return weights
+
+def standard_structures(ladder, width):
+    """Straddle plus, for each i up to width: strangle, long call butterfly and long iron butterfly ±i strikes
+
+    Every structure is a net debit, so its value stays positive and changes read like the straddle's.
+    """
+    specs = {'Straddle': {('C', 0): 1, ('P', 0): 1}}
+    for i in range(1, width + 1):
+        specs[f'Strangle ±{i}'] = {('C', i): 1, ('P', -i): 1}
+    for i in range(1, width + 1):
+        specs[f'Butterfly ±{i}'] = {('C', -i): 1, ('C', 0): -2, ('C', i): 1}
+    for i in range(1, width + 1):
+        # Straddle with short wings: long volatility with capped gains and a cheaper entry
+        specs[f'Iron Butterfly ±{i}'] = {('C', 0): 1, ('P', 0): 1, ('C', i): -1, ('P', -i): -1}
+
+    structures = {}
+    for name, legs in specs.items():
+        weights = leg_weights(ladder, legs)
+        if weights is not None:
+            structures[name] = weights
+    return structures
+
+def price_structures(matrix, structures):
+    """(timestamp x structure) values: the leg matrix times the stacked weight vectors"""
+    weights = np.column_stack(list(structures.values()))
+    missing = np.isnan(matrix)
+    values = np.where(missing, 0.0, matrix) @ weights
+    # A structure has no value at a bar where any leg it holds has no price yet
+    values[(missing.astype(float) @ (weights != 0)) > 0] = np.nan
+    return values
+
+def score_structures(values, names, earnings_idx):
+    """Initial, pre-earnings and final values with percentage changes per structure (like compute_metrics)"""
+    initial, final = values[0], values[-1]
+    # Earnings on the first bar leave no pre-earnings bar (index -1 would wrap to the last one)
+    pre = values[earnings_idx - 1] if earnings_idx >= 1 else np.full(values.shape[1], np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = pd.DataFrame({
+            'initial': initial,
+            'pre_earnings': pre,
+            'final': final,
+            'pre_earnings_change': (pre - initial) / initial * 100,
+            'post_earnings_change': (final - pre) / pre * 100,
+            'total_change': (final - initial) / initial * 100,
+        }, index=pd.Index(names, name='structure'))
+    return scores
@@ -0,0 +1,136 @@
+"""Parsed options chains: vectorized OCC symbol parsing and binary-search strike lookups"""
+import numpy as np
+
+# OCC symbols end in a fixed 15 character suffix: YYMMDD + C/P + strike * 1000 (8 digits)
+SUFFIX_LEN = 15
+
+def parse_occ_symbols(symbols):
+    """Parse OCC symbols into root, expiry (datetime64[D]), right ('C'/'P') and strike arrays"""
+    symbols = np.asarray(symbols, dtype=str)
+    if symbols.size == 0:
+        return {'symbol': symbols, 'root': symbols, 'expiry': np.array([], dtype='datetime64[D]'),
+                'right': symbols, 'strike': np.array([], dtype=float)}
+
+    # Right-align every symbol so the suffix lands in the same columns, then work on code points
+    width = symbols.dtype.itemsize // 4
+    padded = np.char.rjust(symbols, width)
+    chars = padded.view(np.uint32).reshape(len(symbols), width)
+    digits = chars.astype(np.int64) - ord('0')
+
+    strike = digits[:, -8:] @ (10 ** np.arange(7, -1, -1)) / 1000
+    yymmdd = digits[:, -SUFFIX_LEN:-9] @ (10 ** np.arange(5, -1, -1))
+    years = 2000 + yymmdd // 10000
+    months = (yymmdd // 100) % 100
+    days = yymmdd % 100
+    expiry = ((years - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (months - 1)).astype('datetime64[D]') + (days - 1)
+
+    right = np.where(chars[:, -9] == ord('C'), 'C', 'P')
+    roots = np.ascontiguousarray(chars[:, :-SUFFIX_LEN]).view(f'U{width - SUFFIX_LEN}').ravel()
+
+    return {'symbol': symbols, 'root': np.char.strip(roots), 'expiry': expiry, 'right': right, 'strike': strike}
+
+
+class OptionChain:
+    """Contracts sorted by (expiry, right, strike) so strike selection is a binary search"""
+
+    def __init__(self, symbols, expiry, right, strike):
+        expiry = np.asarray(expiry, dtype='datetime64[D]')
+        right = np.asarray(right, dtype=str)
+        strike = np.asarray(strike, dtype=float)
+
+        order = np.lexsort((strike, right, expiry))
+        self.symbols = np.asarray(symbols, dtype=str)[order]
+        self.expiry = expiry[order]
+        self.right = right[order]
+        self.strike = strike[order]
+        # Sortable group key: calls then puts within each expiry
+        self._group_keys = self.expiry.astype(np.int64) * 2 + (self.right == 'P')
+
+    @classmethod
+    def from_symbols(cls, symbols):
+        parsed = parse_occ_symbols(symbols)
+        return cls(parsed['symbol'], parsed['expiry'], parsed['right'], parsed['strike'])
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def expiries(self):
+        return np.unique(self.expiry)
+
+    def _group(self, expiry, right):
+        key = np.datetime64(expiry, 'D').astype(np.int64) * 2 + (right == 'P')
+        lo = np.searchsorted(self._group_keys, key, side='left')
+        hi = np.searchsorted(self._group_keys, key, side='right')
+        return slice(lo, hi)
+
+    def strikes(self, expiry, right):
+        return self.strike[self._group(expiry, right)]
+
+    def symbol(self, expiry, right, strike):
+        """OCC symbol for an exact contract, None if it isn't listed"""
+        group = self._group(expiry, right)
+        strikes = self.strike[group]
+        i = np.searchsorted(strikes, strike)
+        if i < len(strikes) and np.isclose(strikes[i], strike):
+            return str(self.symbols[group][i])
+        return None
+
+    def nearest_strike(self, price, expiry, right=None):
+        """Listed strike closest to price for an expiry (either right when right is None)"""
+        if right is None:
+            strikes = np.intersect1d(self.strikes(expiry, 'C'), self.strikes(expiry, 'P'))
+        else:
+            strikes = self.strikes(expiry, right)
+        return _nearest(strikes, price)
+
+    def atm_expiry(self, price):
+        """(expiry, strike) with the strike closest to price listed as both a call and a put
+
+        Ties between expiries go to the earliest one.
+        """
+        best = None
+        for expiry in self.expiries():
+            strike = self.nearest_strike(price, expiry)
+            if strike is None:
+                continue
+            if best is None or abs(strike - price) < abs(best[1] - price):
+                best = (expiry, strike)
+        return best
+
+    def atm_pair(self, price):
+        """[call, put] at the strike closest to price, listed as both a call and a put"""
+        best = self.atm_expiry(price)
+        if best is None:
+            return None
+        expiry, strike = best
+        return [self.symbol(expiry, 'C', strike), self.symbol(expiry, 'P', strike)]
+
+    def strike_ladder(self, price, width):
+        """Up to `width` strikes either side of the ATM strike (calls and puts both listed) on the ATM expiry
+
+        Returns {'expiry', 'strikes', 'atm', 'calls', 'puts'} where atm is the ATM position in strikes,
+        or None when nothing is listed.
+        """
+        best = self.atm_expiry(price)
+        if best is None:
+            return None
+        expiry, atm_strike = best
+        strikes = np.intersect1d(self.strikes(expiry, 'C'), self.strikes(expiry, 'P'))
+        center = int(np.searchsorted(strikes, atm_strike))
+        lo, hi = max(0, center - width), min(len(strikes), center + width + 1)
+        strikes = strikes[lo:hi]
+        return {
+            'expiry': expiry,
+            'strikes': strikes,
+            'atm': center - lo,
+            'calls': [self.symbol(expiry, 'C', k) for k in strikes],
+            'puts': [self.symbol(expiry, 'P', k) for k in strikes],
+        }
+
+
+def _nearest(sorted_values, target):
+    if len(sorted_values) == 0:
+        return None
+    i = np.searchsorted(sorted_values, target)
+    candidates = sorted_values[max(0, i - 1):i + 1]
+    return float(candidates[np.argmin(np.abs(candidates - target))])
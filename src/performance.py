@@ -0,0 +1,180 @@
+"""Straddle metrics and the performance tables shared by the dashboard and batch mode"""
+import pandas as pd
+import numpy as np
+import storage
+import logging
+import traceback
+from datetime import datetime, timedelta
+import get_earnings_dates
+import get_options
+import event_study
+import implied_vol
+import ladder
+import option_chain
+import result_cache
+import telemetry
+
+logger = logging.getLogger('app_logger')
+
+def log_pre_earnings(ticker, earnings_date, lookback_days, pre_earnings_change):
+    save_performance_rows([(ticker, earnings_date, lookback_days, pre_earnings_change)], [])
+
+def log_post_earnings(ticker, earnings_date, lookahead_days, post_earnings_change):
+    save_performance_rows([], [(ticker, earnings_date, lookahead_days, post_earnings_change)])
+
+def save_performance_rows(pre_rows, post_rows):
+    """Bulk insert (ticker, earnings_date, days, change) rows into both performance tables"""
+    now = datetime.now().isoformat()
+    with telemetry.span('db_write', rows=len(pre_rows) + len(post_rows)), storage.transaction() as conn:
+        conn.executemany('''INSERT OR REPLACE INTO pre_earnings_performance VALUES (?, ?, ?, ?, ?)''',
+                         [(t, str(d), days, change, now) for t, d, days, change in pre_rows])
+        conn.executemany('''INSERT OR REPLACE INTO post_earnings_performance VALUES (?, ?, ?, ?, ?)''',
+                         [(t, str(d), days, change, now) for t, d, days, change in post_rows])
+
+
+def prepare_straddle_frame(df):
+    """Convert timestamps to EST, drop rows with missing data and add timestamp labels"""
+    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.tz_convert('US/Eastern')
+    df = df.dropna(subset=['call_close', 'put_close', 'straddle'])
+
+    # Create numerical index and format timestamp labels
+    df = df.reset_index(drop=True)
+    df['timestamp_label'] = df['timestamp'].dt.strftime('%m/%d %H:%M')
+    return df
+
+def find_earnings_index(df, earnings_date, earnings_time):
+    """Find the bar closest to the earnings release (before = 9:30, after = 16:00) by binary search"""
+    release = event_study.earnings_timestamp(earnings_date, earnings_time)
+    return event_study.nearest_index(pd.DatetimeIndex(df['timestamp']).as_unit('ns').asi8, release.value)
+
+def compute_metrics(df, earnings_idx):
+    """Initial, pre-earnings and final straddle values with their percentage changes"""
+    return event_study.event_metrics([df['straddle'].to_numpy()], [earnings_idx]).iloc[0].to_dict()
+
+def parse_contract(ticker, symbols):
+    """Get strike and expiry from the call symbol"""
+    if not symbols:
+        return 'N/A', 'N/A'
+    contract = option_chain.parse_occ_symbols(symbols[:1])
+    return float(contract['strike'][0]), str(contract['expiry'][0])
+
+def analyze_event(ticker, earnings_date, earnings_time, lookback, lookahead, bar_minutes=15):
+    """Run the straddle pipeline for one earnings event, returns None when there is no options data
+
+    Results are memoized per (ticker, earnings_date, lookback, lookahead, bar_minutes) across reruns and sessions.
+    """
+    key = (ticker, earnings_date, lookback, lookahead, bar_minutes)
+    with telemetry.labels(ticker=ticker, event=earnings_date), telemetry.span('event_pipeline') as span:
+        result, hit = result_cache.results.get_or_compute(
+            key, lambda: _analyze_event(ticker, earnings_date, earnings_time, lookback, lookahead, bar_minutes))
+        span.hit(hit)
+        return result
+
+def _analyze_event(ticker, earnings_date, earnings_time, lookback, lookahead, bar_minutes):
+    df, symbols = get_options.get_options_data(ticker, earnings_date, lookback, lookahead, bar_minutes)
+    if df is None or df.empty:
+        return None
+
+    logger.info(f"Successfully fetched {len(df)} data points")
+    with telemetry.span('dataframe_build'):
+        df = prepare_straddle_frame(df)
+    logger.info(f"After filtering: {len(df)} valid data points")
+
+    earnings_idx = find_earnings_index(df, earnings_date, earnings_time)
+    strike, expiry_date = parse_contract(ticker, symbols)
+    with telemetry.span('implied_vol', bars=len(df)):
+        df = implied_vol.add_volatility_columns(df, symbols, earnings_idx)
+
+    return {
+        'df': df,
+        'symbols': symbols,
+        'earnings_idx': earnings_idx,
+        'strike': strike,
+        'expiry_date': expiry_date,
+        'metrics': compute_metrics(df, earnings_idx),
+        'volatility': implied_vol.volatility_metrics(df, earnings_idx),
+    }
+
+def recent_earnings(ticker, history_days):
+    """(earnings_date, earnings_time) of the reports within the last history_days, newest first"""
+    # The calendar scrape grows to 4 rows per year of history
+    years = max(5, -(-history_days // 365))
+    dates = get_earnings_dates.get_past_earnings_dates(ticker, limit=years * 4, years=years) or []
+    cutoff_date = datetime.today().date() - timedelta(days=history_days)
+    return [(d, t) for d, t in dates if d > cutoff_date]
+
+def warm_caches(ticker, earnings_dates, lookback, lookahead):
+    """Prefetch the 9:45 prices (one request) and chains (concurrently) for every event of a ticker
+
+    Failures are only logged; they resurface per event when the event is analyzed.
+    """
+    try:
+        get_options.prefetch_stock_prices(ticker, earnings_dates, lookback, lookahead)
+    except Exception as e:
+        logger.warning(f"Could not prefetch 9:45 prices for {ticker}: {str(e)}")
+    get_options.prefetch_chains(ticker, earnings_dates, lookback, lookahead)
+
+def analyze_ticker(ticker, lookback, lookahead, bar_minutes=15, history_days=366):
+    """Run the straddle pipeline for every report of a ticker within history_days
+
+    Returns [(earnings_date, earnings_time, result, error)] newest first, where result is
+    None for events without options data or that failed, and error is the failure message.
+    """
+    dates = recent_earnings(ticker, history_days)
+    warm_caches(ticker, [d for d, _ in dates], lookback, lookahead)
+
+    events = []
+    for earnings_date, earnings_time in dates:
+        try:
+            result = analyze_event(ticker, earnings_date, earnings_time, lookback, lookahead, bar_minutes)
+            events.append((earnings_date, earnings_time, result, None))
+        except Exception as e:
+            logger.error(f"Error for {ticker} {earnings_date}: {str(e)}")
+            logger.debug(traceback.format_exc())
+            events.append((earnings_date, earnings_time, None, str(e)))
+    return events
+
+def analyze_ladder(ticker, earnings_date, earnings_time, lookback, lookahead, width, bar_minutes=15):
+    """Price and score the standard structures on a strike ladder around one earnings event
+
+    Memoized like analyze_event; returns None when there is no options data.
+    """
+    key = ('ladder', ticker, earnings_date, lookback, lookahead, width, bar_minutes)
+    with telemetry.labels(ticker=ticker, event=earnings_date), telemetry.span('ladder_pipeline') as span:
+        result, hit = result_cache.results.get_or_compute(
+            key, lambda: _analyze_ladder(ticker, earnings_date, earnings_time, lookback, lookahead, width, bar_minutes))
+        span.hit(hit)
+        return result
+
+def _analyze_ladder(ticker, earnings_date, earnings_time, lookback, lookahead, width, bar_minutes):
+    timestamps, matrix, strike_ladder = get_options.get_ladder_data(ticker, earnings_date, lookback, lookahead,
+                                                                    width, bar_minutes)
+    if timestamps is None or not len(timestamps):
+        return None
+
+    with telemetry.span('dataframe_build'):
+        structures = ladder.standard_structures(strike_ladder, width)
+        values = ladder.price_structures(matrix, structures)
+        # Drop structures with a leg that never traded, then bars where any remaining structure is unpriced
+        priced = ~np.isnan(values).all(axis=0)
+        names = [name for name, keep in zip(structures, priced) if keep]
+        values = values[:, priced]
+        complete = ~np.isnan(values).any(axis=1)
+        if not names or not complete.any():
+            return None
+
+        df = pd.DataFrame(values[complete].round(2), columns=names)
+        df.insert(0, 'timestamp', timestamps[complete].tz_convert('US/Eastern'))
+        df['timestamp_label'] = df['timestamp'].dt.strftime('%m/%d %H:%M')
+    logger.info(f"Priced {len(names)} structures over {len(df)} bars")
+
+    earnings_idx = find_earnings_index(df, earnings_date, earnings_time)
+    return {
+        'df': df,
+        'structures': names,
+        'strikes': strike_ladder['strikes'].tolist(),
+        'atm_strike': float(strike_ladder['strikes'][strike_ladder['atm']]),
+        'expiry_date': str(strike_ladder['expiry']),
+        'earnings_idx': earnings_idx,
+        'scores': ladder.score_structures(df[names].to_numpy(), names, earnings_idx),
+    }
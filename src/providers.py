@@ -0,0 +1,78 @@
+"""Registry of lazily constructed API clients and shared resources
+
+Nothing heavy is imported or connected until a provider is first requested, so the
+data modules import quickly and work outside Streamlit. Tests and benchmarks can
+swap any provider for a stand-in with override().
+"""
+import threading
+import os
+
+# Environment variables consulted before Streamlit secrets
+SECRET_ENV = {
+    'key': 'ALPACA_KEY',
+    'sec': 'ALPACA_SECRET',
+    'mdata_token': 'MARKETDATA_TOKEN',
+}
+
+_factories = {}
+_instances = {}
+_lock = threading.RLock()
+
+def secret(name):
+    """API credential from the environment, falling back to .streamlit/secrets.toml"""
+    value = os.environ.get(SECRET_ENV.get(name, name.upper()))
+    if value:
+        return value
+    import streamlit as st
+    try:
+        return st.secrets[name]
+    except Exception as e:
+        raise KeyError(f"Missing secret {name!r}: set {SECRET_ENV.get(name, name.upper())} "
+                       f"or add it to .streamlit/secrets.toml") from e
+
+def register(name, factory):
+    """Make factory() build the provider on first use"""
+    with _lock:
+        _factories[name] = factory
+
+def get(name):
+    """The provider's process-wide instance, built on first use"""
+    with _lock:
+        if name not in _instances:
+            _instances[name] = _factories[name]()
+        return _instances[name]
+
+def override(name, instance):
+    """Use instance instead of building the provider (stand-ins for tests and benchmarks)"""
+    with _lock:
+        _instances[name] = instance
+
+def reset(name=None):
+    """Drop built instances so the next get() rebuilds them"""
+    with _lock:
+        if name is None:
+            _instances.clear()
+        else:
+            _instances.pop(name, None)
+
+
+def _option_client():
+    from alpaca.data.historical.option import OptionHistoricalDataClient
+    # raw_data skips building a pydantic model per bar; responses stay plain JSON dicts
+    return OptionHistoricalDataClient(secret('key'), secret('sec'), raw_data=True)
+
+def _stock_client():
+    from alpaca.data.historical import StockHistoricalDataClient
+    # Raw like the option client, so bars go straight to bar_store.bars_to_frame
+    return StockHistoricalDataClient(secret('key'), secret('sec'), raw_data=True)
+
+def _browser_pool():
+    import atexit
+    import browser_pool
+    pool = browser_pool.BrowserPool()
+    atexit.register(pool.shutdown)
+    return pool
+
+register('option_client', _option_client)
+register('stock_client', _stock_client)
+register('browser_pool', _browser_pool)
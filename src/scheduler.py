@@ -0,0 +1,226 @@
+"""Background prefetch for a watchlist: warms the SQLite caches and precomputes metrics ahead of earnings reports
+
+Jobs live in SQLite (prefetch_jobs) so the queue survives restarts. Each watchlist ticker
+gets a warm-up job shortly before its next report and a capture job once the report's
+lookahead window has closed. Jobs run off-peak only, at a reduced share of the API rate limits.
+
+Usage:
+    python src/scheduler.py add NVDA AAPL MSFT
+    python src/scheduler.py remove MSFT
+    python src/scheduler.py list
+    python src/scheduler.py run              # long-running worker
+    python src/scheduler.py run --once       # run what is due now and exit (e.g. from cron)
+"""
+import argparse
+import logging
+import time
+import traceback
+from datetime import datetime, timedelta
+import analytics
+import batch
+import config
+import gateway
+import get_earnings_dates
+import performance
+import storage
+import trading_calendar
+
+logger = logging.getLogger('app_logger')
+
+def add_tickers(tickers):
+    """Put tickers on the watchlist with a warm-up job at the next off-peak slot"""
+    now = datetime.now()
+    run_after = next_off_peak(now).isoformat()
+    with storage.transaction() as conn:
+        conn.executemany('''INSERT OR IGNORE INTO watchlist VALUES (?, ?)''',
+                         [(t, now.isoformat()) for t in tickers])
+        conn.executemany('''INSERT OR IGNORE INTO prefetch_jobs VALUES (?, ?, 'warm', ?, 'pending', 0, NULL, ?)''',
+                         [(t, str(now.date()), run_after, now.isoformat()) for t in tickers])
+
+def remove_tickers(tickers):
+    """Drop tickers from the watchlist along with their pending jobs"""
+    with storage.transaction() as conn:
+        conn.executemany('''DELETE FROM watchlist WHERE ticker = ?''', [(t,) for t in tickers])
+        conn.executemany('''DELETE FROM prefetch_jobs WHERE ticker = ? AND status = ?''',
+                         [(t, 'pending') for t in tickers])
+
+def get_watchlist():
+    conn = storage.get_connection()
+    return [row[0] for row in conn.execute('''SELECT ticker FROM watchlist ORDER BY ticker''')]
+
+def get_jobs(limit=50):
+    """Most recently scheduled jobs, as (ticker, event_date, kind, run_after, status, attempts, last_error)"""
+    conn = storage.get_connection()
+    return conn.execute('''SELECT ticker, event_date, kind, run_after, status, attempts, last_error
+                           FROM prefetch_jobs ORDER BY run_after DESC LIMIT ?''', (limit,)).fetchall()
+
+
+def in_off_peak(moment):
+    start, end = config.OFF_PEAK_HOURS
+    if moment.weekday() >= 5:
+        return True
+    if start > end:  # window wraps past midnight
+        return moment.hour >= start or moment.hour < end
+    return start <= moment.hour < end
+
+def next_off_peak(after):
+    """Earliest off-peak moment at or after `after`"""
+    if in_off_peak(after):
+        return after
+    start = after.replace(hour=config.OFF_PEAK_HOURS[0], minute=0, second=0, microsecond=0)
+    return start if start > after else start + timedelta(days=1)
+
+def next_report_date(ticker):
+    """Announced next report date, else one estimated from the ticker's report history"""
+    dates = get_earnings_dates.get_past_earnings_dates(ticker) or []
+    _, next_date, _ = get_earnings_dates.get_refresh_state(ticker)
+    if next_date is None and dates:
+        next_date = get_earnings_dates.expected_next_report([d for d, _ in dates])
+    return next_date
+
+def plan_jobs():
+    """Queue warm-up and capture jobs for each watchlist ticker's next report, returns the number queued"""
+    now = datetime.now()
+    calendar = trading_calendar.get_calendar()
+    max_lookahead = max(lookahead for _, lookahead in config.STANDARD_SETTINGS)
+    jobs = []
+    for ticker in get_watchlist():
+        try:
+            next_date = next_report_date(ticker)
+        except Exception as e:
+            logger.warning(f"Could not get the next report date for {ticker}: {str(e)}")
+            continue
+        if next_date is None:
+            continue
+
+        # Warm up ahead of the report, capture the new event once its last lookahead session has closed
+        warm_at = datetime.combine(next_date - timedelta(days=config.PREFETCH_LEAD_DAYS), datetime.min.time())
+        _, last_idx = calendar.window(next_date, 0, max_lookahead)
+        capture_at = datetime.combine(calendar.session(last_idx) + timedelta(days=1), datetime.min.time())
+        jobs += [(ticker, str(next_date), 'warm', next_off_peak(max(now, warm_at)).isoformat()),
+                 (ticker, str(next_date), 'capture', next_off_peak(max(now, capture_at)).isoformat())]
+
+    with storage.transaction() as conn:
+        before = conn.total_changes
+        conn.executemany('''INSERT OR IGNORE INTO prefetch_jobs VALUES (?, ?, ?, ?, 'pending', 0, NULL, ?)''',
+                         [(*job, now.isoformat()) for job in jobs])
+        return conn.total_changes - before
+
+def claim_job():
+    """Mark the earliest due pending job as running and return it, None when nothing is due"""
+    now = datetime.now().isoformat()
+    with storage.transaction() as conn:
+        row = conn.execute('''SELECT ticker, event_date, kind, attempts FROM prefetch_jobs
+                              WHERE status = 'pending' AND run_after <= ?
+                              ORDER BY run_after LIMIT 1''', (now,)).fetchone()
+        if row is None:
+            return None
+        conn.execute('''UPDATE prefetch_jobs SET status = 'running', attempts = attempts + 1, updated_at = ?
+                        WHERE ticker = ? AND event_date = ? AND kind = ?''', (now, *row[:3]))
+    return {'ticker': row[0], 'event_date': row[1], 'kind': row[2], 'attempts': row[3] + 1}
+
+def finish_job(job, error=None):
+    """Mark a job done, or requeue it with a delay until it runs out of attempts"""
+    now = datetime.now()
+    if error is None:
+        status, run_after = 'done', now
+    elif job['attempts'] < config.SCHEDULER_MAX_ATTEMPTS:
+        status, run_after = 'pending', next_off_peak(now + timedelta(hours=job['attempts']))
+    else:
+        status, run_after = 'failed', now
+    with storage.transaction() as conn:
+        conn.execute('''UPDATE prefetch_jobs SET status = ?, run_after = ?, last_error = ?, updated_at = ?
+                        WHERE ticker = ? AND event_date = ? AND kind = ?''',
+                     (status, run_after.isoformat(), error, now.isoformat(),
+                      job['ticker'], job['event_date'], job['kind']))
+
+def requeue_interrupted():
+    """Jobs left 'running' by a crashed or killed scheduler go back in the queue"""
+    with storage.transaction() as conn:
+        conn.execute('''UPDATE prefetch_jobs SET status = ? WHERE status = ?''', ('pending', 'running'))
+
+def warm_ticker(ticker):
+    """Fill the earnings, chain, price and bar caches and the performance tables for every standard setting
+
+    Only these SQLite-backed stores reach the dashboard and API; the per-event results land in
+    this process's result cache and are rebuilt there (from stored data, without upstream calls).
+    """
+    events = 0
+    for lookback, lookahead in config.STANDARD_SETTINGS:
+        result = batch.process_ticker(ticker, lookback, lookahead, history_days=366)
+        performance.save_performance_rows(result['pre_rows'], result['post_rows'])
+        events += result['events']
+        if result['errors']:
+            raise RuntimeError(f"{result['errors']} events failed for lookback {lookback}, lookahead {lookahead}")
+    analytics.refresh_summaries(market_max_age=0)
+    return events
+
+def run_job(job):
+    logger.info(f"Running {job['kind']} job for {job['ticker']} ({job['event_date']}), attempt {job['attempts']}")
+    try:
+        events = warm_ticker(job['ticker'])
+    except Exception as e:
+        logger.error(f"{job['kind']} job for {job['ticker']} failed: {str(e)}")
+        logger.debug(traceback.format_exc())
+        finish_job(job, error=str(e))
+        return
+    finish_job(job)
+    logger.info(f"Warmed {job['ticker']}: {events} events")
+
+def run(once=False, anytime=False):
+    """Work through due jobs during off-peak hours; with once=True, stop when nothing is due"""
+    # Leave the rest of each provider's rate budget to dashboard users
+    gateway.limit_rates(config.SCHEDULER_RATE_SHARE)
+    requeue_interrupted()
+    last_plan = None
+    while True:
+        now = datetime.now()
+        if not anytime and not in_off_peak(now):
+            if once:
+                logger.info("Outside off-peak hours, nothing to do")
+                return
+            time.sleep(min((next_off_peak(now) - now).total_seconds(), config.SCHEDULER_POLL_SEC))
+            continue
+
+        if last_plan is None or time.monotonic() - last_plan > config.SCHEDULER_PLAN_INTERVAL_SEC:
+            logger.info(f"Planned {plan_jobs()} new jobs")
+            last_plan = time.monotonic()
+
+        job = claim_job()
+        if job is None:
+            if once:
+                return
+            time.sleep(config.SCHEDULER_POLL_SEC)
+            continue
+        run_job(job)
+        time.sleep(config.SCHEDULER_JOB_PAUSE_SEC)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefetch watchlist tickers ahead of their earnings reports")
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help="Add tickers to the watchlist")
+    add.add_argument('tickers', nargs='+')
+    remove = commands.add_parser('remove', help="Remove tickers from the watchlist")
+    remove.add_argument('tickers', nargs='+')
+    commands.add_parser('list', help="Show the watchlist and recent jobs")
+    run_cmd = commands.add_parser('run', help="Process the job queue")
+    run_cmd.add_argument('--once', action='store_true', help="Exit when no job is due instead of waiting")
+    run_cmd.add_argument('--anytime', action='store_true', help="Ignore the off-peak window")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == 'add':
+        add_tickers([t.upper() for t in args.tickers])
+    elif args.command == 'remove':
+        remove_tickers([t.upper() for t in args.tickers])
+    elif args.command == 'list':
+        print(f"Watchlist: {', '.join(get_watchlist()) or '(empty)'}")
+        for ticker, event_date, kind, run_after, status, attempts, last_error in get_jobs():
+            print(f"  {ticker:6} {event_date} {kind:8} {status:8} after {run_after[:16]} "
+                  f"attempts {attempts}{f' ({last_error})' if last_error else ''}")
+    else:
+        run(once=args.once, anytime=args.anytime)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""Shared SQLite access layer: owns the schema, runs migrations once and pools WAL connections"""
+from contextlib import contextmanager
+import threading
+import sqlite3
+import os
+import config
+
+def _mark_dirty(row, phase, days_col):
+    """Trigger body statements queueing the ticker, sector and market-wide summaries a row feeds"""
+    return f'''
+        INSERT OR IGNORE INTO performance_dirty VALUES ('ticker', {row}.ticker, '{phase}', {row}.{days_col});
+        INSERT OR IGNORE INTO performance_dirty
+            SELECT 'sector', sector, '{phase}', {row}.{days_col} FROM ticker_sectors WHERE ticker = {row}.ticker;
+        INSERT OR IGNORE INTO performance_dirty VALUES ('all', '*', '{phase}', {row}.{days_col});'''
+
+def _mark_sector_dirty(row):
+    """Trigger body statements queueing a sector's summaries for every window its ticker has rows in"""
+    return f'''
+        INSERT OR IGNORE INTO performance_dirty
+            SELECT DISTINCT 'sector', {row}.sector, 'pre', lookback_days
+            FROM pre_earnings_performance WHERE ticker = {row}.ticker;
+        INSERT OR IGNORE INTO performance_dirty
+            SELECT DISTINCT 'sector', {row}.sector, 'post', lookahead_days
+            FROM post_earnings_performance WHERE ticker = {row}.ticker;'''
+
+# Each entry upgrades the schema by one version (tracked in PRAGMA user_version)
+MIGRATIONS = [
+    [
+        '''CREATE TABLE IF NOT EXISTS earnings
+           (ticker TEXT, earnings_date DATE, earnings_time TEXT, fetched_at TIMESTAMP,
+            PRIMARY KEY (ticker, earnings_date))''',
+        '''CREATE TABLE IF NOT EXISTS options_chain
+           (ticker TEXT, start_date DATE, from_date DATE, to_date DATE,
+            symbols TEXT, fetched_at TIMESTAMP,
+            PRIMARY KEY (ticker, start_date, from_date, to_date))''',
+        '''CREATE TABLE IF NOT EXISTS stock_price_945
+           (ticker TEXT, date DATE, close REAL, fetched_at TIMESTAMP,
+            PRIMARY KEY (ticker, date))''',
+        # The primary key doubles as a covering index for (symbol, timeframe, timestamp) range scans
+        '''CREATE TABLE IF NOT EXISTS option_bars
+           (symbol TEXT, timeframe INTEGER, timestamp TEXT, open REAL, high REAL, low REAL,
+            close REAL, volume REAL, trade_count REAL, vwap REAL,
+            PRIMARY KEY (symbol, timeframe, timestamp)) WITHOUT ROWID''',
+        # Time ranges already fetched per contract, so empty stretches aren't re-requested either
+        '''CREATE TABLE IF NOT EXISTS option_bar_ranges
+           (symbol TEXT, timeframe INTEGER, range_start TEXT, range_end TEXT,
+            PRIMARY KEY (symbol, timeframe, range_start))''',
+        '''CREATE TABLE IF NOT EXISTS pre_earnings_performance
+           (ticker TEXT, earnings_date DATE, lookback_days INTEGER, pre_earnings_change REAL,
+            logged_at TIMESTAMP, PRIMARY KEY (ticker, earnings_date, lookback_days))''',
+        '''CREATE TABLE IF NOT EXISTS post_earnings_performance
+           (ticker TEXT, earnings_date DATE, lookahead_days INTEGER, post_earnings_change REAL,
+            logged_at TIMESTAMP, PRIMARY KEY (ticker, earnings_date, lookahead_days))''',
+        '''CREATE TABLE IF NOT EXISTS batch_checkpoint
+           (run_id TEXT, ticker TEXT, events INTEGER, errors INTEGER, completed_at TIMESTAMP,
+            PRIMARY KEY (run_id, ticker))''',
+    ],
+    [
+        # Chains are stored as parsed OCC rows instead of one JSON blob per request
+        'DROP TABLE IF EXISTS options_chain',
+        '''CREATE TABLE options_chain
+           (ticker TEXT, start_date DATE, from_date DATE, to_date DATE,
+            contracts INTEGER, fetched_at TIMESTAMP,
+            PRIMARY KEY (ticker, start_date, from_date, to_date))''',
+        '''CREATE TABLE option_contracts
+           (ticker TEXT, quote_date DATE, expiry DATE, option_right TEXT, strike REAL, symbol TEXT,
+            PRIMARY KEY (ticker, quote_date, expiry, option_right, strike)) WITHOUT ROWID''',
+    ],
+    [
+        # Per-ticker scrape bookkeeping for incremental earnings refresh
+        '''CREATE TABLE earnings_refresh
+           (ticker TEXT PRIMARY KEY, last_scraped_at TIMESTAMP, next_date DATE, next_time TEXT)''',
+    ],
+    [
+        # Optional sink for pipeline timing spans
+        '''CREATE TABLE telemetry_spans
+           (started_at TIMESTAMP, stage TEXT, duration_ms REAL, cache_hit INTEGER, error TEXT,
+            ticker TEXT, event TEXT)''',
+        'CREATE INDEX idx_telemetry_spans_stage ON telemetry_spans (stage, started_at)',
+    ],
+    [
+        # Materialized per ticker / sector / market-wide statistics of the performance tables,
+        # kept current by triggers that queue the groups a write touches in performance_dirty
+        '''CREATE TABLE ticker_sectors (ticker TEXT PRIMARY KEY, sector TEXT NOT NULL)''',
+        'CREATE INDEX idx_ticker_sectors_sector ON ticker_sectors (sector, ticker)',
+        '''CREATE TABLE performance_summary
+           (scope TEXT, group_key TEXT, phase TEXT, window_days INTEGER, events INTEGER,
+            mean REAL, median REAL, p10 REAL, p25 REAL, p75 REAL, p90 REAL, win_rate REAL,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (scope, phase, window_days, group_key)) WITHOUT ROWID''',
+        '''CREATE TABLE performance_dirty
+           (scope TEXT, group_key TEXT, phase TEXT, window_days INTEGER,
+            PRIMARY KEY (scope, group_key, phase, window_days)) WITHOUT ROWID''',
+        # Covering indexes for recomputing one group without touching the base table rows
+        'CREATE INDEX idx_pre_perf_ticker ON pre_earnings_performance (ticker, lookback_days, pre_earnings_change)',
+        'CREATE INDEX idx_pre_perf_window ON pre_earnings_performance (lookback_days, pre_earnings_change)',
+        'CREATE INDEX idx_post_perf_ticker ON post_earnings_performance (ticker, lookahead_days, post_earnings_change)',
+        'CREATE INDEX idx_post_perf_window ON post_earnings_performance (lookahead_days, post_earnings_change)',
+        *[f'''CREATE TRIGGER {table}_{event.lower()}_dirty AFTER {event} ON {table} BEGIN{body}
+            END'''
+          for table, phase, days_col in [('pre_earnings_performance', 'pre', 'lookback_days'),
+                                         ('post_earnings_performance', 'post', 'lookahead_days')]
+          for event, body in [('INSERT', _mark_dirty('NEW', phase, days_col)),
+                              ('UPDATE', _mark_dirty('OLD', phase, days_col) + _mark_dirty('NEW', phase, days_col)),
+                              ('DELETE', _mark_dirty('OLD', phase, days_col))]],
+        *[f'''CREATE TRIGGER ticker_sectors_{event.lower()}_dirty AFTER {event} ON ticker_sectors BEGIN{body}
+            END'''
+          for event, body in [('INSERT', _mark_sector_dirty('NEW')),
+                              ('UPDATE', _mark_sector_dirty('OLD') + _mark_sector_dirty('NEW')),
+                              ('DELETE', _mark_sector_dirty('OLD'))]],
+        # Queue every group that already has rows so the first refresh backfills the summaries
+        '''INSERT OR IGNORE INTO performance_dirty
+           SELECT DISTINCT 'ticker', ticker, 'pre', lookback_days FROM pre_earnings_performance''',
+        '''INSERT OR IGNORE INTO performance_dirty
+           SELECT DISTINCT 'all', '*', 'pre', lookback_days FROM pre_earnings_performance''',
+        '''INSERT OR IGNORE INTO performance_dirty
+           SELECT DISTINCT 'ticker', ticker, 'post', lookahead_days FROM post_earnings_performance''',
+        '''INSERT OR IGNORE INTO performance_dirty
+           SELECT DISTINCT 'all', '*', 'post', lookahead_days FROM post_earnings_performance''',
+    ],
+    [
+        # Background prefetch: tickers to keep warm and a persistent job queue (one job per ticker, event and kind)
+        '''CREATE TABLE watchlist (ticker TEXT PRIMARY KEY, added_at TIMESTAMP)''',
+        '''CREATE TABLE prefetch_jobs
+           (ticker TEXT, event_date DATE, kind TEXT, run_after TIMESTAMP, status TEXT,
+            attempts INTEGER, last_error TEXT, updated_at TIMESTAMP,
+            PRIMARY KEY (ticker, event_date, kind)) WITHOUT ROWID''',
+        'CREATE INDEX idx_prefetch_jobs_due ON prefetch_jobs (status, run_after)',
+    ],
+    [
+        # Deepest calendar page size scraped per ticker, so longer histories trigger one deeper scrape
+        'ALTER TABLE earnings_refresh ADD COLUMN history_rows INTEGER DEFAULT 20',
+    ],
+    [
+        # Underlying bars for implied/realized moves, same layout as the option bar store
+        '''CREATE TABLE IF NOT EXISTS stock_bars
+           (symbol TEXT, timeframe INTEGER, timestamp TEXT, open REAL, high REAL, low REAL,
+            close REAL, volume REAL, trade_count REAL, vwap REAL,
+            PRIMARY KEY (symbol, timeframe, timestamp)) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS stock_bar_ranges
+           (symbol TEXT, timeframe INTEGER, range_start TEXT, range_end TEXT,
+            PRIMARY KEY (symbol, timeframe, range_start))''',
+    ],
+    [
+        # Failed earnings scrapes, so they are retried after a backoff instead of on every call
+        'ALTER TABLE earnings_refresh ADD COLUMN last_failed_at TIMESTAMP',
+    ],
+]
+
+PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',  # WAL keeps this crash-safe without an fsync per commit
+    f'PRAGMA busy_timeout = {config.DB_BUSY_TIMEOUT_MS}',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -20000',  # ~20 MB page cache per connection
+]
+
+_local = threading.local()
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+def get_connection():
+    """Connection owned by the current thread, reopened after a fork"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid() and _local.path == config.DB_PATH:
+        return conn
+
+    # isolation_level=None: single statements autocommit, transaction() groups writes
+    conn = sqlite3.connect(config.DB_PATH, isolation_level=None, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    _local.conn, _local.pid, _local.path, _local.depth = conn, os.getpid(), config.DB_PATH, 0
+    migrate(conn)
+    return conn
+
+def migrate(conn):
+    """Bring the schema up to date, once per database per process"""
+    key = (os.getpid(), config.DB_PATH)
+    with _migrate_lock:
+        if key in _migrated:
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for target, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {target}')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        _migrated.add(key)
+
+@contextmanager
+def transaction():
+    """Group writes into one transaction (and one fsync); nested blocks join the outer one"""
+    conn = get_connection()
+    if _local.depth:
+        _local.depth += 1
+        try:
+            yield conn
+        finally:
+            _local.depth -= 1
+        return
+
+    conn.execute('BEGIN IMMEDIATE')
+    _local.depth = 1
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    else:
+        conn.execute('COMMIT')
+    finally:
+        _local.depth = 0
@@ -0,0 +1,110 @@
+"""Timing spans around pipeline stages, kept in a bounded ring buffer with optional JSONL/SQLite sinks"""
+from contextlib import contextmanager
+from collections import deque
+from datetime import datetime
+import pandas as pd
+import contextvars
+import threading
+import logging
+import time
+import json
+import config
+import storage
+
+_spans = deque(maxlen=config.TELEMETRY_BUFFER_SIZE)
+_logs = deque(maxlen=config.LOG_BUFFER_SIZE)
+_sink_lock = threading.Lock()
+_labels = contextvars.ContextVar('telemetry_labels', default={})
+
+class Span:
+    """One timed stage; call hit() inside the block to flag a cache hit or miss"""
+
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = labels
+        self.started_at = datetime.now().isoformat()
+        self.duration_ms = None
+        self.cache_hit = None
+        self.error = None
+
+    def hit(self, flag=True):
+        self.cache_hit = bool(flag)
+
+    def to_dict(self):
+        return {'stage': self.stage, 'started_at': self.started_at, 'duration_ms': self.duration_ms,
+                'cache_hit': self.cache_hit, 'error': self.error, **self.labels}
+
+@contextmanager
+def span(stage, **labels):
+    """Time the with-block as one stage, tagged with the current labels plus any given here"""
+    s = Span(stage, {**_labels.get(), **labels})
+    start = time.perf_counter()
+    try:
+        yield s
+    except Exception as e:
+        s.error = type(e).__name__
+        raise
+    finally:
+        s.duration_ms = (time.perf_counter() - start) * 1000
+        record(s)
+
+@contextmanager
+def labels(**values):
+    """Attach labels (ticker, event, ...) to every span opened in the with-block"""
+    token = _labels.set({**_labels.get(), **{k: str(v) for k, v in values.items()}})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+def record(s):
+    entry = s.to_dict()
+    _spans.append(entry)
+
+    if config.TELEMETRY_JSONL_PATH:
+        with _sink_lock, open(config.TELEMETRY_JSONL_PATH, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+    if config.TELEMETRY_SQLITE:
+        with storage.transaction() as conn:
+            conn.execute('''INSERT INTO telemetry_spans VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                         (entry['started_at'], entry['stage'], entry['duration_ms'], entry['cache_hit'],
+                          entry['error'], entry.get('ticker'), entry.get('event')))
+
+
+def recent_spans():
+    return list(_spans)
+
+def stage_summary():
+    """Per-stage count, p50/p95 latency, cache hit rate and error count from the ring buffer"""
+    df = pd.DataFrame(recent_spans())
+    if df.empty:
+        return df
+    flagged = df.dropna(subset=['cache_hit'])
+    summary = df.groupby('stage')['duration_ms'].agg(
+        count='count',
+        p50_ms=lambda d: d.quantile(0.5),
+        p95_ms=lambda d: d.quantile(0.95),
+        total_ms='sum',
+    )
+    summary['cache_hit_rate'] = flagged.groupby('stage')['cache_hit'].mean()
+    summary['errors'] = df.groupby('stage')['error'].count()
+    return summary.sort_values('total_ms', ascending=False).round(1)
+
+
+class BufferHandler(logging.Handler):
+    """Keeps formatted log records in a bounded buffer for the Logs tab"""
+
+    def emit(self, record):
+        try:
+            _logs.append((record.levelno, self.format(record)))
+        except Exception:
+            self.handleError(record)
+
+def recent_logs(min_level=logging.INFO):
+    return [line for level, line in list(_logs) if level >= min_level]
+
+def clear_logs():
+    _logs.clear()
+
+log_handler = BufferHandler()
+log_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
@@ -0,0 +1,44 @@
+"""NYSE trading-day index built once per process and queried with binary search"""
+import pandas as pd
+import numpy as np
+import threading
+from datetime import datetime, timedelta
+import config
+
+class TradingCalendar:
+    """Sorted session dates with their open/close times"""
+
+    def __init__(self, schedule):
+        self.sessions = schedule.index.values.astype('datetime64[D]')
+        self.market_open = pd.DatetimeIndex(schedule['market_open']).tz_convert('UTC')
+        self.market_close = pd.DatetimeIndex(schedule['market_close']).tz_convert('UTC')
+
+    def session_index(self, date):
+        """Index of the session on date, or the next session when date isn't a trading day"""
+        i = int(np.searchsorted(self.sessions, np.datetime64(date, 'D'), side='left'))
+        if i >= len(self.sessions):
+            raise ValueError(f"{date} is beyond the trading calendar (ends {self.sessions[-1]})")
+        return i
+
+    def session(self, i):
+        return self.sessions[i].astype(object)
+
+    def window(self, date, before, after):
+        """Indices of the sessions `before` sessions before and `after` sessions after date"""
+        i = self.session_index(date)
+        return max(0, i - before), min(len(self.sessions) - 1, i + after)
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+def get_calendar():
+    """Process-wide NYSE calendar, built on first use"""
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None:
+            import pandas_market_calendars as mcal  # slow import, only needed to build the index
+            end = datetime.now().date() + timedelta(days=365 * config.CALENDAR_YEARS_AHEAD)
+            schedule = mcal.get_calendar('NYSE').schedule(start_date=config.CALENDAR_START, end_date=end)
+            _calendar = TradingCalendar(schedule)
+        return _calendar
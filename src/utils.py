@@ -1,85 +1,193 @@
-from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
-from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
 from datetime import datetime, timedelta
-import requests
-import sqlite3
-import json
-import streamlit as st
-
-# Load API keys from Streamlit secrets
-alpaca_key = st.secrets["key"]
-alpaca_sec = st.secrets["sec"]
-mdata_token = st.secrets["mdata_token"]
-stock_client = StockHistoricalDataClient(alpaca_key, alpaca_sec)
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import storage
+import config
+import telemetry
+import gateway
+import providers
+import bar_store
+import http_client
+import logging
+from option_chain import OptionChain
 
 def get_stock_price_at_945(ticker, date):
     """Get stock price at 9:45 AM EST using 15-min bar close"""
-    start_time = f"{date.strftime('%Y-%m-%d')}T09:30:00-05:00"
-    end_time = f"{date.strftime('%Y-%m-%d')}T10:00:00-05:00"
+    return get_stock_prices_at_945([(ticker, date)]).get((ticker, date))
+
+def get_stock_prices_at_945(pairs):
+    """Get 9:45 AM EST prices for many (ticker, date) pairs, returns {(ticker, date): close}"""
+    with telemetry.span('price_945', pairs=len(pairs)) as span:
+        pairs = list(dict.fromkeys(pairs))
+    
+        # Check cache first
+        prices = get_cached_stock_prices(pairs)
+        missing = [p for p in pairs if p not in prices]
+        span.hit(not missing)
+        if not missing:
+            return prices
+    
+        # Each ticker's dates are clustered into spans of up to PRICE_945_SPAN_DAYS; tickers
+        # with identical spans share one multi-symbol request
+        by_span = {}
+        for ticker in sorted({t for t, _ in missing}):
+            for span_dates in cluster_dates(sorted(d for t, d in missing if t == ticker), config.PRICE_945_SPAN_DAYS):
+                by_span.setdefault((span_dates[0], span_dates[-1]), []).append(ticker)
+        fetched = {}
+        for (first_date, last_date), tickers in sorted(by_span.items()):
+            fetched.update(_fetch_opening_closes(tickers, first_date, last_date))
+    
+        rows = [(t, d, fetched.get((t, d))) for t, d in missing]
+        prices.update({(t, d): close for t, d, close in rows if close is not None})
+    
+        # Historical prices never change; misses are only stored for past dates
+        today = datetime.now().date()
+        save_stock_prices([(t, d, close) for t, d, close in rows if close is not None or d < today])
+        return prices
+
+def cluster_dates(dates, max_span_days):
+    """Split sorted dates into runs whose first and last date are at most max_span_days apart"""
+    clusters = []
+    for date in dates:
+        if clusters and (date - clusters[-1][0]).days <= max_span_days:
+            clusters[-1].append(date)
+        else:
+            clusters.append([date])
+    return clusters
+
+def _fetch_opening_closes(tickers, first_date, last_date):
+    """{(ticker, date): close} of each session's first 15-min bar between 9:30 and 10:00 EST, the 9:45 price
+
+    One request covers first_date to last_date; the client follows next_page_token, so a
+    year of bars is still one call per ticker under the 10k-bar page size.
+    """
+    from alpaca.data.requests import StockBarsRequest
+    from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
     
     req = StockBarsRequest(
-        symbol_or_symbols=ticker,
-        start=start_time,
-        end=end_time,
+        symbol_or_symbols=tickers,
+        start=pd.Timestamp(f"{first_date} 09:30").tz_localize('US/Eastern'),
+        end=pd.Timestamp(f"{last_date} 10:00").tz_localize('US/Eastern'),
         timeframe=TimeFrame(15, TimeFrameUnit('Min'))
     )
+    key = ('stock_bars_945', tuple(tickers), first_date, last_date)
+    bars = bar_store.bars_to_frame(gateway.get('alpaca').call(key, lambda: providers.get('stock_client').get_stock_bars(req)))
     
-    bars = stock_client.get_stock_bars(req)
-    data = bars.model_dump()['data']
-    
-    if ticker in data and len(data[ticker]) > 0:
-        return data[ticker][0]['close']
-    return None
+    # The close of each ticker's first bar between 9:30 and 10:00 EST is its 9:45 price
+    stamps = pd.to_datetime(bars['timestamp'], utc=True).dt.tz_convert('US/Eastern')
+    minutes = stamps.dt.hour * 60 + stamps.dt.minute
+    opening = bars.assign(timestamp=stamps)[(minutes >= 9 * 60 + 30) & (minutes < 10 * 60)]
+    first = opening.sort_values('timestamp').groupby(['symbol', opening['timestamp'].dt.date])['close'].first()
+    return {(ticker, date): close for (ticker, date), close in first.items()}
+
+def get_cached_stock_prices(pairs):
+    """Cached prices for the pairs, dates stored without a bar map to None"""
+    conn = storage.get_connection()
+    results = {}
+    for ticker in {t for t, _ in pairs}:
+        c = conn.execute('''SELECT date, close FROM stock_price_945 WHERE ticker = ?''', (ticker,))
+        results.update({(ticker, datetime.strptime(row[0], '%Y-%m-%d').date()): row[1] for row in c.fetchall()})
+    return {p: results[p] for p in pairs if p in results}
+
+def save_stock_prices(rows):
+    now = datetime.now().isoformat()
+    with storage.transaction() as conn:
+        conn.executemany('''INSERT OR REPLACE INTO stock_price_945 VALUES (?, ?, ?, ?)''',
+                         [(ticker, str(date), close, now) for ticker, date, close in rows])
 
 def get_historical_options_chain(ticker, start_date, from_date, to_date):
-    init_options_db()
+    """Options chain quoted on start_date with expiries from from_date to to_date, as an OptionChain"""
+    with telemetry.span('chain_fetch', ticker=ticker) as span:
+        # Check cache first
+        cached = get_cached_options_chain(ticker, start_date, from_date, to_date)
+        span.hit(cached is not None)
+        if cached is not None:
+            return cached
     
-    # Check cache first
-    cached = get_cached_options_chain(ticker, start_date, from_date, to_date)
-    if cached:
-        return cached
+        url = f"{config.MARKETDATA_BASE_URL}/v1/options/chain/{ticker}/"
+        # Only the symbols are used, so skip the quote columns that make up most of the payload
+        params = {'date': start_date, 'from': from_date, 'to': to_date, 'columns': 'optionSymbol'}
+        headers = {
+            'Accept': 'application/json',
+            'Authorization': f"Bearer {providers.secret('mdata_token')}"
+        }
+        key = (ticker, start_date, from_date, to_date)
+        symbols = gateway.get('marketdata').call(key, lambda: fetch_chain_symbols(url, headers, params))
+        if symbols is None:
+            logging.warning(f"No options chain data for {ticker} on {start_date}")
+            return None
     
-    url = f"https://api.marketdata.app/v1/options/chain/{ticker}/?date={start_date}&from={from_date}&to={to_date}"
-    headers = {
-        'Accept': 'application/json',
-        'Authorization': f'Bearer {mdata_token}'
-    }
-    response = requests.get(url, headers=headers)
+        chain = OptionChain.from_symbols(symbols)
+        save_options_chain(ticker, start_date, from_date, to_date, chain)
+        return chain
+
+def fetch_chain_symbols(url, headers, params=None):
+    """Option symbols from a marketdata.app chain response, None if it has no data for the request
+
+    The body is decoded once over the pooled session. Error responses raise UpstreamError
+    so they are retried instead of being treated as a chain.
+    """
+    response = http_client.get(url, headers=headers, params=params)
+    try:
+        data = response.json()
+    except ValueError:
+        raise gateway.UpstreamError('marketdata', f"non-JSON response ({response.status_code})", response.status_code)
     
-    if 'optionSymbol' in response.json():
-        symbols = response.json()['optionSymbol']
-        save_options_chain(ticker, start_date, from_date, to_date, symbols)
-        return symbols
-    return response.json()
+    if 'optionSymbol' in data:
+        return data['optionSymbol']
+    if data.get('s') == 'no_data':
+        return None
+    raise gateway.UpstreamError('marketdata', data.get('errmsg', f"unexpected response {data.get('s')!r}"), response.status_code)
 
+def fetch_chains(chain_requests, concurrency=config.CHAIN_FETCH_CONCURRENCY):
+    """Many (ticker, start_date, from_date, to_date) chains at once, up to `concurrency` in flight
 
-def init_options_db():
-    conn = sqlite3.connect('earnings.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS options_chain
-                 (ticker TEXT, start_date DATE, from_date DATE, to_date DATE, 
-                  symbols TEXT, fetched_at TIMESTAMP,
-                  PRIMARY KEY (ticker, start_date, from_date, to_date))''')
-    conn.commit()
-    conn.close()
+    Returns OptionChain, None or the raised exception for each request, in order. This is a
+    blocking call; from a thread that already runs an event loop (where asyncio.run raises)
+    the fetch loop runs on a helper thread instead, blocking that loop until it finishes.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_fetch_chains(chain_requests, concurrency))
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, _fetch_chains(chain_requests, concurrency)).result()
+
+async def _fetch_chains(chain_requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def fetch(request):
+        async with semaphore:
+            return await asyncio.to_thread(get_historical_options_chain, *request)
+    
+    return await asyncio.gather(*(fetch(r) for r in chain_requests), return_exceptions=True)
 
 def get_cached_options_chain(ticker, start_date, from_date, to_date):
-    conn = sqlite3.connect('earnings.db')
-    c = conn.cursor()
+    conn = storage.get_connection()
+    # A chain fetched after its quote date has closed never changes; only same-day quotes expire
     one_month_ago = (datetime.now() - timedelta(days=30)).isoformat()
-    c.execute('''SELECT symbols FROM options_chain 
-                 WHERE ticker = ? AND start_date = ? AND from_date = ? AND to_date = ? AND fetched_at > ?''',
-              (ticker, start_date, from_date, to_date, one_month_ago))
-    result = c.fetchone()
-    conn.close()
-    return json.loads(result[0]) if result else None
-
-def save_options_chain(ticker, start_date, from_date, to_date, symbols):
-    conn = sqlite3.connect('earnings.db')
-    c = conn.cursor()
-    c.execute('''INSERT OR REPLACE INTO options_chain VALUES (?, ?, ?, ?, ?, ?)''',
-              (ticker, start_date, from_date, to_date, json.dumps(symbols), datetime.now().isoformat()))
-    conn.commit()
-    conn.close()
+    c = conn.execute('''SELECT 1 FROM options_chain 
+                        WHERE ticker = ? AND start_date = ? AND from_date = ? AND to_date = ?
+                        AND (fetched_at > ? OR fetched_at >= date(start_date, '+1 day'))''',
+                     (ticker, start_date, from_date, to_date, one_month_ago))
+    if c.fetchone() is None:
+        return None
+    
+    # Primary key range scan on (ticker, quote_date, expiry)
+    c = conn.execute('''SELECT symbol, expiry, option_right, strike FROM option_contracts
+                        WHERE ticker = ? AND quote_date = ? AND expiry BETWEEN ? AND ?''',
+                     (ticker, start_date, from_date, to_date))
+    rows = c.fetchall()
+    if not rows:
+        return OptionChain([], [], [], [])
+    symbols, expiry, right, strike = zip(*rows)
+    return OptionChain(symbols, expiry, right, strike)
 
+def save_options_chain(ticker, start_date, from_date, to_date, chain):
+    rows = zip([ticker] * len(chain), [start_date] * len(chain), chain.expiry.astype(str),
+               chain.right, chain.strike.tolist(), chain.symbols)
+    with storage.transaction() as conn:
+        conn.executemany('''INSERT OR REPLACE INTO option_contracts VALUES (?, ?, ?, ?, ?, ?)''', rows)
+        conn.execute('''INSERT OR REPLACE INTO options_chain VALUES (?, ?, ?, ?, ?, ?)''',
+                     (ticker, start_date, from_date, to_date, len(chain), datetime.now().isoformat()))